@@ -2,26 +2,23 @@ import dash
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_table
-import numpy as np
+import flask
 
 # import functions from .py files
+import app_datasets as app_ds
 import app_graphing as app_gr
 import app_wrangling as app_wr
 
-# load board game data
-boardgame_data = app_wr.call_boardgame_data()
+# load board game data and its lookup index
+boardgame_data, boardgame_index = app_wr.call_boardgame_data()
 
 # dictionary for tab 1 slider
 max_year = boardgame_data["year_published"].max().year
 slider_dict = {x: str(x) for x in range(1950, (max_year + 1), 5)}
 
-# dictionary for dropdowns
-col_key_list = ["category", "mechanic", "publisher"]
-col_value_list = [app_wr.subset_data(boardgame_data, v) for v in col_key_list]
-col_dict = dict(zip(col_key_list, col_value_list))
-
 # radio dict
 radio_options = [
     {"label": " Categories", "value": "category"},
@@ -40,6 +37,18 @@ extents_3d = {
 }
 
 
+# dropdown options of a multi-label column
+def label_options(col, search, values):
+    """
+    :return: Options of the most frequent values of a column matching
+    the search typed in a dropdown, keeping the chosen values.
+    """
+    names = app_wr.call_label_options(boardgame_index, col, search)
+    vocab = boardgame_index["labels"][col]["lookup"]
+    chosen = [v for v in values or [] if v in vocab and v not in names]
+    return [{"label": x, "value": x} for x in names + chosen]
+
+
 # title for all tabs
 def title():
     """
@@ -233,9 +242,7 @@ def generate_control_card_tab2():
             dcc.Dropdown(
                 id="category-widget-tab2",
                 value="",
-                options=[
-                    {"label": name, "value": name} for name in col_dict["category"]
-                ],
+                options=label_options("category", "", []),
                 multi=True,
             ),
             html.Br(),
@@ -243,9 +250,7 @@ def generate_control_card_tab2():
             dcc.Dropdown(
                 id="mechanics-widget-tab2",
                 value="",
-                options=[
-                    {"label": name, "value": name} for name in col_dict["mechanic"]
-                ],
+                options=label_options("mechanic", "", []),
                 multi=True,
             ),
             html.Br(),
@@ -253,9 +258,7 @@ def generate_control_card_tab2():
             dcc.Dropdown(
                 id="publisher-widget-tab2",
                 value="",
-                options=[
-                    {"label": name, "value": name} for name in col_dict["publisher"]
-                ],
+                options=label_options("publisher", "", []),
                 multi=True,
             ),
             html.Br(),
@@ -294,14 +297,18 @@ def generate_control_card_tab3():
             html.H6("Select elements to view:"),
             dcc.Dropdown(
                 id="radio-dependent-tab3",
-                options=[],
+                options=label_options("category", "", ["Negotiation", "Farming"]),
                 multi=True,
                 value=["Negotiation", "Farming"],
             ),
             html.Br(),
             html.H6("Select game to highlight:"),
             dcc.Dropdown(
-                id="games-dependent-tab3", options=[], multi=False, value=None
+                id="games-dependent-tab3",
+                options=[],
+                multi=False,
+                value=None,
+                placeholder="Type to search games",
             ),
         ],
     )
@@ -752,7 +759,8 @@ control_card_tab3 = dbc.Card(
                                 "Select game categories, mechanics and publishers or populate \
                                 the 3D plot. Click and drag to  move around the \
                                 3D plot, and use the mouse to zoom. Simply hover \
-                                over and click a game to view game facts."
+                                over and click a game to view game facts \
+                                and the games closest to it."
                             ),
                         ],
                         id="popover3",
@@ -782,6 +790,18 @@ control_card_tab3 = dbc.Card(
             html.Br(),
             html.H6("Publishers:"),
             html.Div(id="tsne-data-out-publishers"),
+            html.Br(),
+            html.H6("Most Similar Games:"),
+            html.Div(id="tsne-data-out-recommended"),
+            html.Br(),
+            html.H6("Closest Games In The Plot:"),
+            dcc.Checklist(
+                id="similar-filter-tab3",
+                options=[{"label": " Only selected elements", "value": "filter"}],
+                value=[],
+                labelStyle={"display": "block"},
+            ),
+            html.Div(id="tsne-data-out-similar"),
         ]
     ),
     color="#F3F2F2",
@@ -797,6 +817,14 @@ tab_3_plot = dbc.Card(
                     html.Br(),
                     html.H5("3D Game Explorer"),
                     dcc.Graph(id="tsne-3d-plot", style={"height": "80vh"}),
+                    # parts of the figure, assembled in the browser so updates
+                    # only send the traces that changed:
+                    dcc.Store(id="tsne-3d-background"),
+                    dcc.Store(
+                        id="tsne-3d-layout", data=app_gr.graph_3D_layout(extents_3d)
+                    ),
+                    dcc.Store(id="tsne-3d-overlay"),
+                    dcc.Store(id="tsne-3d-highlight"),
                 ]
             ),
         ]
@@ -828,6 +856,26 @@ app = dash.Dash(
 )
 server = app.server
 
+
+# chart datasets, immutable as they are named by the hash of their contents,
+# any path is matched so names that aren't a hash are answered with 404
+@server.route(app_ds.DATASET_URL.format("<path:name>"))
+def serve_dataset(name):
+    """
+    :return: Json records of a chart dataset stored by app_datasets.
+    """
+    path = app_ds.dataset_path(name)
+    try:
+        with open(path, "rb") as f:
+            payload = f.read()
+    except (TypeError, OSError):
+        flask.abort(404)
+    response = flask.Response(payload, mimetype="application/json")
+    response.set_etag(name)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response.make_conditional(flask.request)
+
+
 # app layout
 app.layout = html.Div(
     dbc.Container(
@@ -847,9 +895,12 @@ app.layout = html.Div(
                     ]
                 ),
                 dcc.Tabs(
-                    [
+                    id="tabs",
+                    value="tab-1",
+                    children=[
                         dcc.Tab(
                             label="Game Trends",
+                            value="tab-1",
                             children=[
                                 html.Div(
                                     [
@@ -869,6 +920,7 @@ app.layout = html.Div(
                         ),
                         dcc.Tab(
                             label="Top Games",
+                            value="tab-2",
                             children=[
                                 html.Div(
                                     [
@@ -898,6 +950,7 @@ app.layout = html.Div(
                         ),
                         dcc.Tab(
                             label="3D Game Explorer",
+                            value="tab-3",
                             children=[
                                 html.Div(
                                     [
@@ -915,8 +968,13 @@ app.layout = html.Div(
                             style=tab_style,
                             selected_style=tab_selected_style,
                         ),
-                    ]
+                    ],
                 ),
+                # set once a tab is first shown, its charts are only
+                # computed from then on:
+                dcc.Store(id="tab-1-visited"),
+                dcc.Store(id="tab-2-visited"),
+                dcc.Store(id="tab-3-visited"),
             ],
             style={"backgroundColor": "#DDDCDC"},
         ),
@@ -927,63 +985,68 @@ app.layout = html.Div(
 
 
 # Set up callbacks/backend
+# marks the tabs shown so far
+for tab in ["tab-1", "tab-2", "tab-3"]:
+    app.clientside_callback(
+        ClientsideFunction(
+            namespace="clientside", function_name="visit_" + tab.replace("-", "_")
+        ),
+        Output(tab + "-visited", "data"),
+        Input("tabs", "value"),
+        State(tab + "-visited", "data"),
+    )
+
+
 # modal data set description
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_modal"),
     Output("modal", "is_open"),
-    [Input("open", "n_clicks"), Input("close", "n_clicks")],
-    [State("modal", "is_open")],
+    Input("open", "n_clicks"),
+    Input("close", "n_clicks"),
+    State("modal", "is_open"),
 )
-def toggle_modal_description(n1, n2, is_open):
-    """
-    :return: Open modal callback if user clicks data set description button on tab 1.
-    """
-    if n1 or n2:
-        return not is_open
-    return is_open
 
 
 # modal tab 1 description
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_modal"),
     Output("modal2", "is_open"),
-    [Input("open2", "n_clicks"), Input("close2", "n_clicks")],
-    [State("modal2", "is_open")],
+    Input("open2", "n_clicks"),
+    Input("close2", "n_clicks"),
+    State("modal2", "is_open"),
 )
-def toggle_modal_tab1(n1, n2, is_open):
-    """
-    :return: Open modal callback if user clicks tab 1 description button on tab 1.
-    """
-    if n1 or n2:
-        return not is_open
-    return is_open
 
 
 # Button over select for how to use tab 1 on control card
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_open"),
     Output("popover", "is_open"),
-    [Input("popover-target", "n_clicks")],
-    [State("popover", "is_open")],
+    Input("popover-target", "n_clicks"),
+    State("popover", "is_open"),
 )
-def toggle_popover_tab1(n, is_open):
-    """
-    :return: Open pop-over callback for how to use button for tab 1.
-    """
-    if n:
-        return not is_open
-    return is_open
 
 
-# radio button selection options to populate drop downs for tab1
+# radio button selection and search options to populate drop downs for tab1
 @app.callback(
-    dash.dependencies.Output("radio-dependent-tab1", "options"),
-    dash.dependencies.Output("radio-dependent-tab1", "value"),
-    [dash.dependencies.Input("radio-selection-tab1", "value")],
+    Output("radio-dependent-tab1", "options"),
+    Input("radio-selection-tab1", "value"),
+    Input("radio-dependent-tab1", "search_value"),
+    State("radio-dependent-tab1", "value"),
 )
-def update_options_tab1(chosen_selection):
+def update_options_tab1(chosen_selection, search, values):
     """
     :return: Callback to generate drop down based on radio button selection.
     """
     col = chosen_selection
-    return [{"label": c, "value": c} for c in col_dict[col]], []
+    return label_options(col, search, values)
+
+
+# radio button selection clears the drop down for tab1
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="clear_values"),
+    Output("radio-dependent-tab1", "value"),
+    Input("radio-selection-tab1", "value"),
+)
 
 
 # scatter plot tab 1
@@ -992,13 +1055,18 @@ def update_options_tab1(chosen_selection):
     Input("radio-selection-tab1", "value"),
     Input("radio-dependent-tab1", "value"),
     Input("min-num-ratings", "value"),
+    Input("tab-1-visited", "data"),
+    prevent_initial_call=True,
 )
-def call_scatter_tab1(col, list_, n_ratings):
+def call_scatter_tab1(col, list_, n_ratings, visited):
     """
     :return: Scatter plot of game ratings on tab 1.
     """
-    chart = app_gr.scatter_plot_dates(boardgame_data, col, list_, n_ratings)
-    return chart.to_html()
+    if not visited:
+        raise PreventUpdate
+    return app_gr.scatter_plot_dates(
+        boardgame_data, boardgame_index, col, list_, n_ratings
+    )
 
 
 # stacked histogram of counts annual published counts
@@ -1007,26 +1075,26 @@ def call_scatter_tab1(col, list_, n_ratings):
     Input("radio-selection-tab1", "value"),
     Input("radio-dependent-tab1", "value"),
     Input("min-num-ratings", "value"),
+    Input("tab-1-visited", "data"),
+    prevent_initial_call=True,
 )
-def call_counts_tab1(col, list_, n_ratings):
+def call_counts_tab1(col, list_, n_ratings, visited):
     """
     :return: Bar chart of published game counts on tab 1.
     """
-    chart2 = app_gr.count_plot_dates(boardgame_data, col, list_, n_ratings)
-    return chart2.to_html()
+    if not visited:
+        raise PreventUpdate
+    return app_gr.count_plot_dates(
+        boardgame_data, boardgame_index, col, list_, n_ratings
+    )
 
 
 # year range slider output tab 1
-@app.callback(
-    dash.dependencies.Output("top-range-slider-output", "children"),
-    dash.dependencies.Input("top-range-slider", "value"),
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="years_selected"),
+    Output("top-range-slider-output", "children"),
+    Input("top-range-slider", "value"),
 )
-def range_slider_select_tab1(value):
-    """
-    :return: Tab 1 year range slider output years for density plot on tab 1.
-    """
-    transformed_value = [v for v in value]
-    return "Years Selected: {} to {}".format(transformed_value[0], transformed_value[1])
 
 
 # density plot tab 1
@@ -1036,83 +1104,107 @@ def range_slider_select_tab1(value):
     Input("radio-dependent-tab1", "value"),
     Input("top-range-slider", "value"),
     Input("min-num-ratings", "value"),
+    Input("tab-1-visited", "data"),
+    prevent_initial_call=True,
 )
-def call_density_tab1(col, list_, value1, value2):
+def call_density_tab1(col, list_, value1, value2, visited):
     """
     :return: Game rating density plot on tab 1.
     """
+    if not visited:
+        raise PreventUpdate
     transformed_value = [v for v in value1]
     val1 = transformed_value[0]
     val2 = transformed_value[1]
-    density_chart = app_gr.rank_plot_density(
+    return app_gr.rank_plot_density(
         boardgame_data,
+        boardgame_index,
         col,
         list_,
         year_in=int(val1),
         year_out=int(val2),
         n_ratings=value2,
     )
-    return density_chart.to_html()
 
 
 # modal for description tab 2
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_modal"),
     Output("modal3", "is_open"),
-    [Input("open3", "n_clicks"), Input("close3", "n_clicks")],
-    [State("modal3", "is_open")],
+    Input("open3", "n_clicks"),
+    Input("close3", "n_clicks"),
+    State("modal3", "is_open"),
 )
-def toggle_modal_tab(n1, n2, is_open):
-    """
-    :return: Open modal callback if user clicks tab 2 description button on tab 2.
-    """
-    if n1 or n2:
-        return not is_open
-    return is_open
 
 
 # modal for description tab 3
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_modal"),
     Output("modal4", "is_open"),
-    [Input("open4", "n_clicks"), Input("close4", "n_clicks")],
-    [State("modal4", "is_open")],
+    Input("open4", "n_clicks"),
+    Input("close4", "n_clicks"),
+    State("modal4", "is_open"),
+)
+
+
+# Button over select for how to use tab 2 on control card
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_open"),
+    Output("popover2", "is_open"),
+    Input("popover-target2", "n_clicks"),
+    State("popover2", "is_open"),
+)
+
+
+# Button over select for how to use tab 3 on control card
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_open"),
+    Output("popover3", "is_open"),
+    Input("popover-target3", "n_clicks"),
+    State("popover3", "is_open"),
 )
-def toggle_modal_tab3(n1, n2, is_open):
+
+
+# search options to populate the category drop down for tab 2
+@app.callback(
+    Output("category-widget-tab2", "options"),
+    Input("category-widget-tab2", "search_value"),
+    State("category-widget-tab2", "value"),
+    prevent_initial_call=True,
+)
+def update_categories_tab2(search, values):
     """
-    :return: Open modal callback if user clicks tab 3 description button on tab 3.
+    :return: Callback to generate the category drop down on tab 2.
     """
-    if n1 or n2:
-        return not is_open
-    return is_open
+    return label_options("category", search, values)
 
 
-# Button over select for how to use tab 2 on control card
+# search options to populate the mechanic drop down for tab 2
 @app.callback(
-    Output("popover2", "is_open"),
-    [Input("popover-target2", "n_clicks")],
-    [State("popover2", "is_open")],
+    Output("mechanics-widget-tab2", "options"),
+    Input("mechanics-widget-tab2", "search_value"),
+    State("mechanics-widget-tab2", "value"),
+    prevent_initial_call=True,
 )
-def toggle_popover_tab2(n, is_open):
+def update_mechanics_tab2(search, values):
     """
-    :return: Open pop-over callback for how to use button for tab 2.
+    :return: Callback to generate the mechanic drop down on tab 2.
     """
-    if n:
-        return not is_open
-    return is_open
+    return label_options("mechanic", search, values)
 
 
-# Button over select for how to use tab 3 on control card
+# search options to populate the publisher drop down for tab 2
 @app.callback(
-    Output("popover3", "is_open"),
-    [Input("popover-target3", "n_clicks")],
-    [State("popover3", "is_open")],
+    Output("publisher-widget-tab2", "options"),
+    Input("publisher-widget-tab2", "search_value"),
+    State("publisher-widget-tab2", "value"),
+    prevent_initial_call=True,
 )
-def toggle_popover_tab3(n, is_open):
+def update_publishers_tab2(search, values):
     """
-    :return: Open pop-over callback for how to use button for tab 2.
+    :return: Callback to generate the publisher drop down on tab 2.
     """
-    if n:
-        return not is_open
-    return is_open
+    return label_options("publisher", search, values)
 
 
 # top n games bar chart tab 2
@@ -1122,20 +1214,24 @@ def toggle_popover_tab3(n, is_open):
     Input("mechanics-widget-tab2", "value"),
     Input("publisher-widget-tab2", "value"),
     Input("min-num-ratings2", "value"),
+    Input("tab-2-visited", "data"),
+    prevent_initial_call=True,
 )
-def call_top_n_games_tab2(c, m, p, value2):
+def call_top_n_games_tab2(c, m, p, value2, visited):
     """
     :return: Top 10 games plot on tab 2.
     """
-    top_n_games = app_gr.top_n_plot(
+    if not visited:
+        raise PreventUpdate
+    return app_gr.top_n_plot(
         data=boardgame_data,
+        index=boardgame_index,
         cat=c,
         mech=m,
         pub=p,
         n=10,
         n_ratings=value2,
     )
-    return top_n_games.to_html()
 
 
 # data table top n games bar chart tab 2
@@ -1146,12 +1242,16 @@ def call_top_n_games_tab2(c, m, p, value2):
     Input("mechanics-widget-tab2", "value"),
     Input("publisher-widget-tab2", "value"),
     Input("min-num-ratings2", "value"),
+    Input("tab-2-visited", "data"),
+    prevent_initial_call=True,
 )
-def update_table_tab2(c, m, p, value2):
+def update_table_tab2(c, m, p, value2, visited):
     """
     :return: Data frame columns and ouput to
     populate data table(dcc.DataTable) on tab 2.
     """
+    if not visited:
+        raise PreventUpdate
     list_cols = [
         "name",
         "min_players",
@@ -1166,7 +1266,13 @@ def update_table_tab2(c, m, p, value2):
         "users_rated",
     ]
     table = app_wr.call_boardgame_filter(
-        data=boardgame_data, cat=c, mech=m, pub=p, n=10, n_ratings=value2
+        data=boardgame_data,
+        index=boardgame_index,
+        cat=c,
+        mech=m,
+        pub=p,
+        n=10,
+        n_ratings=value2,
     )
     columns = [{"name": col, "id": col} for col in list_cols]
     columns[0]["name"] = ("Game Name",)
@@ -1181,55 +1287,122 @@ def update_table_tab2(c, m, p, value2):
     columns[9]["name"] = "Avg. User Rating"
     columns[10]["name"] = "No. Ratings"
 
-    table_out = app_wr.clean_table(table)
+    table_out = app_wr.clean_table(table, boardgame_index)
     data_out = table_out.to_dict("rows")
     return data_out, columns
 
 
-# radio button selection options to populate dropdowns for tab3
+# radio button selection and search options to populate dropdowns for tab3
 @app.callback(
-    dash.dependencies.Output("radio-dependent-tab3", "options"),
-    [dash.dependencies.Input("radio-selection-tab3", "value")],
+    Output("radio-dependent-tab3", "options"),
+    Input("radio-selection-tab3", "value"),
+    Input("radio-dependent-tab3", "search_value"),
+    State("radio-dependent-tab3", "value"),
+    prevent_initial_call=True,
 )
-def update_options_tab3(chosen_selection):
+def update_options_tab3(chosen_selection, search, values):
     """
     :return: Callback to generate radio buttons on tab 3.
     """
     col = chosen_selection
-    return [{"label": c, "value": c} for c in col_dict[col]]
+    return label_options(col, search, values)
 
 
-# radio button selection options to populate game dropdown for tab3
+# radio button selection and search options to populate game dropdown for tab3
 @app.callback(
     Output("games-dependent-tab3", "options"),
-    [Input("radio-selection-tab3", "value"), Input("radio-dependent-tab3", "value")],
+    Input("games-dependent-tab3", "search_value"),
+    Input("radio-selection-tab3", "value"),
+    Input("radio-dependent-tab3", "value"),
+    Input("tab-3-visited", "data"),
+    State("games-dependent-tab3", "value"),
+    prevent_initial_call=True,
 )
-def update_games_tab3(col, list_):
+def update_games_tab3(search, col, list_, visited, game):
     """
-    :return: Callback to generate drop down based on radio button selection on tab 3.
+    :return: Callback to generate drop down based on radio button selection
+    and the search typed in it on tab 3.
     """
+    if not visited:
+        raise PreventUpdate
     if col == "category":
-        games = app_wr.call_boardgame_filter(boardgame_data, cat=list_)
+        games = app_wr.call_game_search(
+            boardgame_data, boardgame_index, search, cat=list_
+        )
     elif col == "mechanic":
-        games = app_wr.call_boardgame_filter(boardgame_data, mech=list_)
+        games = app_wr.call_game_search(
+            boardgame_data, boardgame_index, search, mech=list_
+        )
     else:
-        games = app_wr.call_boardgame_filter(boardgame_data, pub=list_)
-    return games["name"].map(lambda x: {"label": x, "value": x})
+        games = app_wr.call_game_search(
+            boardgame_data, boardgame_index, search, pub=list_
+        )
+    names = games["name"].tolist()
+    # Keep the chosen game so the dropdown still shows it:
+    if game and game not in names:
+        names.append(game)
+    return [{"label": x, "value": x} for x in names]
 
 
-# tsne graph tab 3
+# tsne graph tab 3, grey trace of every game
 @app.callback(
-    Output("tsne-3d-plot", "figure"),
+    Output("tsne-3d-background", "data"),
+    Input("tab-3-visited", "data"),
+    prevent_initial_call=True,
+)
+def call_tsne_background_tab3(visited):
+    """
+    :return: Background trace of the interactive TSNE plot tab 3.
+    """
+    if not visited:
+        raise PreventUpdate
+    return app_gr.graph_3D_background(boardgame_data, boardgame_index)
+
+
+# tsne graph tab 3, traces of the selected games
+@app.callback(
+    Output("tsne-3d-overlay", "data"),
     Input("radio-selection-tab3", "value"),
     Input("radio-dependent-tab3", "value"),
+    Input("tab-3-visited", "data"),
+    prevent_initial_call=True,
+)
+def call_tsne_tab3(col, list_, visited):
+    """
+    :return: Group traces of the interactive TSNE plot tab 3.
+    """
+    if not visited:
+        raise PreventUpdate
+    traces = app_gr.graph_3D_overlay(boardgame_data, boardgame_index, col, list_)
+    return traces
+
+
+# tsne graph tab 3, trace of the chosen game
+@app.callback(
+    Output("tsne-3d-highlight", "data"),
     Input("games-dependent-tab3", "value"),
+    Input("tab-3-visited", "data"),
+    prevent_initial_call=True,
 )
-def call_tsne_tab3(col, list_, game):
+def call_tsne_highlight_tab3(game, visited):
     """
-    :return: Interactive TSNE plot tab 3.
+    :return: Chosen game trace of the interactive TSNE plot tab 3.
     """
-    fig = app_gr.graph_3D(boardgame_data, col, list_, game, extents_3d)
-    return fig
+    if not visited:
+        raise PreventUpdate
+    traces = app_gr.graph_3D_highlight(boardgame_data, boardgame_index, game)
+    return traces
+
+
+# assembles the tsne graph in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="assemble_figure"),
+    Output("tsne-3d-plot", "figure"),
+    Input("tsne-3d-background", "data"),
+    Input("tsne-3d-layout", "data"),
+    Input("tsne-3d-overlay", "data"),
+    Input("tsne-3d-highlight", "data"),
+)
 
 
 # text output from tsne graph click
@@ -1241,70 +1414,98 @@ def call_tsne_tab3(col, list_, game):
     Output("tsne-data-out-mechanics", "children"),
     Output("tsne-data-out-publishers", "children"),
     Input("tsne-3d-plot", "clickData"),
+    prevent_initial_call=True,
 )
 def display_click_message_tab3(clickData):
     """
     :return: Selected game data to put into control card on tab 3.
     """
     if clickData:
-        click_point_np = np.array(
-            [clickData["points"][0][i] for i in ["x", "y", "z"]]
-        ).astype(np.float64)
-        # Create a mask of the point clicked
-        bool_mask_click = boardgame_data.loc[:, "x":"z"].eq(click_point_np).all(axis=1)
-        # retreive data
-        if bool_mask_click.any():
-            data_out = boardgame_data[bool_mask_click]
-            click_name = data_out.name.values[0]
-            click_sc = "Avg Rating: " + str(round(data_out.average_rating.values[0], 2))
-            click_rat = "No. of Ratings: " + str(data_out.users_rated.values[0])
-            click_cat = ", ".join(data_out.category.values[0])
-            click_mec = ", ".join(data_out.mechanic.values[0])
-            click_pub = ", ".join(data_out.publisher.values[0])
-
-        return click_name, click_sc, click_rat, click_cat, click_mec, click_pub
+        # game id carried by every point of the plot:
+        row = app_wr.game_row(boardgame_index, clickData["points"][0].get("customdata"))
+        if row is not None:
+            data_out = boardgame_data.iloc[row]
+            labels = boardgame_index["labels"]
+            click_name = data_out["name"]
+            click_sc = "Avg Rating: " + str(round(data_out["average_rating"], 2))
+            click_rat = "No. of Ratings: " + str(data_out["users_rated"])
+            click_cat = ", ".join(app_wr.label_lists(labels["category"], [row])[0])
+            click_mec = ", ".join(app_wr.label_lists(labels["mechanic"], [row])[0])
+            click_pub = ", ".join(app_wr.label_lists(labels["publisher"], [row])[0])
+
+            return click_name, click_sc, click_rat, click_cat, click_mec, click_pub
     return None, None, None, None, None, None
 
 
-# slider output container first tab
+# games sharing the most categories and mechanics with the game clicked
 @app.callback(
-    dash.dependencies.Output("slider-output-container_2", "children"),
-    [dash.dependencies.Input("min-num-ratings", "value")],
+    Output("tsne-data-out-recommended", "children"),
+    Input("tsne-3d-plot", "clickData"),
+    prevent_initial_call=True,
 )
-def update_output_tab1(value):
+def display_recommended_games_tab3(clickData):
     """
-    :return: Minimum number of games selected output
-    text on tab 1 based on slider input.
+    :return: Games most similar to the selected game to put into control card on tab 3.
     """
-    return "Min Ratings: {}".format(value)
+    if clickData:
+        similar = app_wr.call_recommended_games(
+            boardgame_data, boardgame_index, clickData["points"][0].get("customdata"), 5
+        )
+        return html.Ol([html.Li(name) for name in similar["name"]])
+    return None
 
 
-# slider output container second tab
+# closest games to the game clicked on the tsne graph
 @app.callback(
-    dash.dependencies.Output("slider-output-container_3", "children"),
-    [dash.dependencies.Input("min-num-ratings2", "value")],
+    Output("tsne-data-out-similar", "children"),
+    Input("tsne-3d-plot", "clickData"),
+    Input("similar-filter-tab3", "value"),
+    Input("radio-selection-tab3", "value"),
+    Input("radio-dependent-tab3", "value"),
+    prevent_initial_call=True,
 )
-def update_output_tab2(value):
+def display_similar_games_tab3(clickData, filter_, col, list_):
     """
-    :return: Minimum number of games selected
-    output text on tab 2 based on slider input.
+    :return: Games closest to the selected game to put into control card on tab 3.
     """
-    return "Min Ratings: {}".format(value)
+    if clickData:
+        if not filter_:
+            col, list_ = None, None
+        similar = app_wr.call_similar_games(
+            boardgame_data,
+            boardgame_index,
+            clickData["points"][0].get("customdata"),
+            5,
+            col,
+            list_,
+        )
+        return html.Ol([html.Li(name) for name in similar["name"]])
+    return None
+
+
+# slider output container first tab
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="min_ratings"),
+    Output("slider-output-container_2", "children"),
+    Input("min-num-ratings", "value"),
+)
+
+
+# slider output container second tab
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="min_ratings"),
+    Output("slider-output-container_3", "children"),
+    Input("min-num-ratings2", "value"),
+)
 
 
 # collapse button for top 10 games fact table
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggle_open"),
     Output("collapse", "is_open"),
-    [Input("collapse-button", "n_clicks")],
-    [State("collapse", "is_open")],
+    Input("collapse-button", "n_clicks"),
+    State("collapse", "is_open"),
 )
-def toggle_collapse_tab2(n, is_open):
-    """
-    :return: Open top 10 games fact table on tab 2 if clicked.
-    """
-    if n:
-        return not is_open
-    return is_open
 
 
 # run
@@ -0,0 +1,103 @@
+"""
+result caching for the wrangling and graphing functions of the dashboard
+"""
+
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+
+
+def memoize(maxsize=64, unordered=()):
+    """
+    Least recently used result cache for functions called with the
+    board game data and user selections.
+
+    Arguments are normalized before forming the cache key: lists are
+    keyed by their values, sorted for the arguments named in `unordered`
+    so the same selection made in a different order is a hit, and
+    unhashable arguments (the data frame and index) are keyed by
+    identity. Cached results are shared between callers, so they must
+    not be modified in place.
+
+    :param maxsize: int, number of results to keep (default 64)
+    :param unordered: tuple of str, names of the list arguments
+        whose order doesn't change the result (default none)
+
+    :return decorator: function
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        cache = OrderedDict()
+        stats = {"hits": 0, "misses": 0}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            # Unhashable arguments are kept with the result so their
+            # ids can't be reused while the entry is cached:
+            refs = []
+            key = tuple(
+                cache_key(value, refs, name in unordered)
+                for name, value in bound.arguments.items()
+            )
+
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats["hits"] += 1
+                    return cache[key][0]
+                stats["misses"] += 1
+
+            result = func(*args, **kwargs)
+
+            with lock:
+                cache[key] = (result, refs)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return result
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(cache), maxsize=maxsize)
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                stats.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+
+        return wrapper
+
+    return decorator
+
+
+def cache_key(value, refs, unordered=False):
+    """
+    Normalizes an argument into a hashable cache key.
+
+    :param value: any argument value
+    :param refs: list, unhashable values keyed by identity are appended
+    :param unordered: bool, key a list by its sorted values (default False)
+
+    :return: hashable key
+    """
+
+    if isinstance(value, (list, tuple)):
+        items = [cache_key(item, refs) for item in value]
+        if unordered:
+            items = sorted(items, key=repr)
+        return ("list", tuple(items))
+    try:
+        hash(value)
+    except TypeError:
+        refs.append(value)
+        return ("id", id(value))
+    return value
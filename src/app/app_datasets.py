@@ -0,0 +1,109 @@
+"""
+content addressed store of the chart datasets served to the browser
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+# Datasets are files named by the hash of their contents, shared by
+# all server processes. Set BOARDGAME_DATASET_DIR to a shared folder
+# when the app is served from several hosts:
+DATASET_DIR = os.environ.get(
+    "BOARDGAME_DATASET_DIR", os.path.join(tempfile.gettempdir(), "boardgame-datasets")
+)
+# Heroku dynos don't share files, a request for a dataset can reach a
+# dyno that didn't store it. There the charts carry their data inline
+# unless the store is set to a shared folder:
+SHARED_STORE = "BOARDGAME_DATASET_DIR" in os.environ or "DYNO" not in os.environ
+# Path the datasets are served from, see app.py:
+DATASET_URL = "/datasets/{}.json"
+# Least recently stored datasets are removed above this many bytes:
+DATASET_MAX_BYTES = 256 * 1024 * 1024
+# Number of stores between checks of the store size:
+PRUNE_EVERY = 200
+
+_lock = threading.Lock()
+_stores = {"count": 0}
+
+
+def store_dataset(payload, name=None):
+    """
+    Stores a serialized dataset under the hash of its contents, or marks
+    it as recently used if it is already stored.
+
+    :param payload: bytes, json records
+    :param name: string, md5 hash of `payload` if already known (default None)
+
+    :return: string, url the dataset is served from
+    """
+
+    name = name or hashlib.md5(payload).hexdigest()
+    path = dataset_path(name)
+    os.makedirs(DATASET_DIR, exist_ok=True)
+
+    if os.path.exists(path):
+        # Mark as recently used so pruning keeps it:
+        os.utime(path)
+    else:
+        # Write to a temporary file first so readers never see a partial dataset:
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with _lock:
+        _stores["count"] += 1
+        prune = _stores["count"] % PRUNE_EVERY == 0
+    if prune:
+        prune_datasets()
+
+    return DATASET_URL.format(name)
+
+
+def dataset_path(name):
+    """
+    Returns the file of a stored dataset.
+
+    :param name: string, hash of the dataset
+
+    :return: string, path to the file, None if `name` is not a hash
+    """
+
+    if not re.fullmatch(r"[0-9a-f]{32}", name):
+        return None
+    return os.path.join(DATASET_DIR, name + ".json")
+
+
+def prune_datasets(max_bytes=DATASET_MAX_BYTES):
+    """
+    Removes the least recently stored datasets until the store is
+    at most `max_bytes`.
+
+    :param max_bytes: int, (default DATASET_MAX_BYTES)
+    """
+
+    files = []
+    for entry in os.scandir(DATASET_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -2,82 +2,175 @@
 contains graph calls for dashboard
 """
 
+import base64
+import functools
+import hashlib
+import json
+
 import altair as alt
+import app_caching as app_ca
+import app_datasets as app_ds
 import app_wrangling as app_wr
+import numpy as np
 import plotly.graph_objs as go
 
+# Above this many games the scatter plot shows counts per year and
+# rating cell instead of every game, to bound the chart size:
+SCATTER_MAX_POINTS = 5000
+# Stands in for a dataset url in a compiled chart template:
+DATA_PLACEHOLDER = "__data_{}__"
+# Data of a compiled chart template loaded from a url, see named_data():
+DATA_URL_SPEC = '{{"url": "{}", "format": {{"type": "json"}}}}'
+
 
-def scatter_plot_dates(data, col="category", list_=[], n_ratings=0):
+def rendered(func):
+    """
+    Renders the serialized chart returned by `func` with render_chart()
+    on every call. The serialized charts are cached, rendering stores
+    the datasets again so a cached chart never links to a dataset that
+    was pruned since it was first made.
+
+    :param func: function returning serialize_chart()
+
+    :return: function returning string of html
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return render_chart(*func(*args, **kwargs))
+
+    return wrapper
+
+
+@rendered
+@app_ca.memoize(unordered=("list_",))
+def scatter_plot_dates(data, index, col="category", list_=[], n_ratings=0):
     """
     Takes in inputs filtering data and creates an altair scatter
     plot for comparison of user ratings over time
 
     :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
     :param col: string indicating which column (default 'category')
     :param list_: list of elements in column (default [])
     :param n_ratings: int of number of minimum rating to filter (default 0)
 
-    :return scatter_plot: altair plot
+    :return: string of html of the altair plot
     """
 
-    # Need to disable max rows in case of showing entire dataset:
-    alt.data_transformers.disable_max_rows()
+    # Only the plotted columns are taken from the data:
+    plot_columns = ["name", "year_published", "average_rating", "users_rated"]
     # If no elements selected return entire dataset:
-    if (list_ == [None]) or (not list_):
-        set_scatter = app_wr.rating_filter(data, n_ratings)
-        # colors the graph grey:
-        set_scatter_col = alt.value("grey")
+    grouped = not ((list_ == [None]) or (not list_))
+    if not grouped:
+        set_scatter = app_wr.select_rows(
+            data, app_wr.rating_mask(data, index, n_ratings), plot_columns
+        )
     else:
         set_scatter = app_wr.call_boardgame_radio(
-            data, col, list_, no_of_ratings=n_ratings
-        ).explode("group")
+            data, index, col, list_, no_of_ratings=n_ratings, columns=plot_columns
+        )
+
+    # create data for the total mean user rating:
+    datasets = {
+        "line": index["year_stats"][["year_published", "mean"]].rename(
+            columns={"mean": "average_rating"}
+        )
+    }
+    binned = len(set_scatter) > SCATTER_MAX_POINTS
+    if binned:
+        # bins the games, with the most rated game of each bin for tooltips:
+        datasets["bins"], sample_data = app_wr.bin_year_rating(set_scatter)
+        datasets["sample"] = app_wr.remove_columns(sample_data)
+    else:
+        # removes extraneous columns:
+        datasets["points"] = app_wr.remove_columns(set_scatter)
+
+    return serialize_chart(scatter_template(grouped, binned), datasets)
+
+
+@app_ca.memoize()
+def scatter_template(grouped=False, binned=False):
+    """
+    Compiles the scatter plot of user ratings over time
+
+    :param grouped: bool, color by the 'group' column (default False)
+    :param binned: bool, plot counts per year and rating cell
+        rather than every game (default False)
+
+    :return: string of html template, see serialize_chart()
+    """
+
+    if grouped:
         # colors the graph according to elements selected:
         set_scatter_col = alt.Color(
             "group:N", title=None, scale=alt.Scale(scheme="dark2")
         )
-    # removes extraneous columns:
-    reduced_data = app_wr.remove_columns(set_scatter)
-    # creates altair scatter plot:
-    scatter_plot = (
-        alt.Chart(reduced_data)
-        .mark_circle(size=60, opacity=0.2)
-        .encode(
-            alt.X(
-                "year_published:T",
-                axis=alt.Axis(title=None, labelFontSize=13, titleFontWeight=100),
-                scale=alt.Scale(zero=False),
-            ),
-            alt.Y(
-                "average_rating:Q",
-                axis=alt.Axis(
-                    title="Average Rating",
-                    titleFontSize=15,
-                    offset=14,
-                    titleFontWeight=100,
-                    labelFontSize=13,
-                ),
-            ),
-            color=set_scatter_col,
-            tooltip=[
-                alt.Tooltip("name:N", title="Name"),
-                alt.Tooltip("average_rating:Q", title="Average Rating"),
-                alt.Tooltip("year_published:T", title="Year Published", format="%Y"),
-            ],
+    else:
+        # colors the graph grey:
+        set_scatter_col = alt.value("grey")
+    # axes shared by the scatter plot layers:
+    x_axis = alt.X(
+        "year_published:T",
+        axis=alt.Axis(title=None, labelFontSize=13, titleFontWeight=100),
+        scale=alt.Scale(zero=False),
+    )
+    y_axis = alt.Y(
+        "average_rating:Q",
+        axis=alt.Axis(
+            title="Average Rating",
+            titleFontSize=15,
+            offset=14,
+            titleFontWeight=100,
+            labelFontSize=13,
+        ),
+    )
+    game_tooltip = [
+        alt.Tooltip("name:N", title="Name"),
+        alt.Tooltip("average_rating:Q", title="Average Rating"),
+        alt.Tooltip("year_published:T", title="Year Published", format="%Y"),
+    ]
+    if binned:
+        bin_plot = (
+            alt.Chart(named_data("bins"))
+            .mark_circle(opacity=0.3)
+            .encode(
+                x_axis,
+                y_axis,
+                color=set_scatter_col,
+                size=alt.Size("count:Q", legend=None, scale=alt.Scale(range=[10, 400])),
+                tooltip=[
+                    alt.Tooltip("year_published:T", title="Year", format="%Y"),
+                    alt.Tooltip("average_rating:Q", title="Average Rating"),
+                    alt.Tooltip("count:Q", title="Games"),
+                ],
+            )
         )
-        .properties(
+        sample_plot = (
+            alt.Chart(named_data("sample"))
+            .mark_circle(size=15, opacity=0.6)
+            .encode(x_axis, y_axis, color=set_scatter_col, tooltip=game_tooltip)
+        )
+        scatter_plot = (bin_plot + sample_plot).properties(
             width=650,
             height=150,
         )
-    )
-    # create data for the total mean user rating:
-    line_plot_data = (
-        data[["year_published", "average_rating"]].groupby("year_published").mean()
-    ).reset_index()
+    else:
+        # creates altair scatter plot:
+        scatter_plot = (
+            alt.Chart(named_data("points"))
+            .mark_circle(size=60, opacity=0.2)
+            .encode(x_axis, y_axis, color=set_scatter_col, tooltip=game_tooltip)
+            .properties(
+                width=650,
+                height=150,
+            )
+        )
     # creates altair plot of the total mean user rating:
     line_plot = (
-        alt.Chart(line_plot_data)
+        alt.Chart(named_data("line"))
         .mark_line(color="#62a9b5", size=3, opacity=0.6)
-        .encode(x="year_published:T", y="average_rating")
+        .encode(x="year_published:T", y="average_rating:Q")
     )
     # combine plots:
     scatter_plot = (
@@ -85,48 +178,51 @@ def scatter_plot_dates(data, col="category", list_=[], n_ratings=0):
         .configure(background="transparent")
         .configure_legend(titleFontSize=18, labelFontSize=13)
     )
-    return scatter_plot
+    return compile_chart(scatter_plot)
 
 
-def count_plot_dates(data, col="category", list_=[], n_ratings=0):
+@rendered
+@app_ca.memoize(unordered=("list_",))
+def count_plot_dates(data, index, col="category", list_=[], n_ratings=0):
     """
     Takes input filtering data and creates
     a plot counting how many game occurrences
 
     :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
     :param col: string indicating which column (default 'category')
     :param list_: list of elements in column (default [])
     :param n_ratings: int of number of minimum rating to filter (default 0)
 
-    :return count_plot: altair plot
+    :return: string of html of the altair plot
     """
 
-    # Need to disable max rows in case of showing entire dataset:
-    alt.data_transformers.disable_max_rows()
-    # If no elements selected return entire dataset:
-    if (list_ == [None]) or (not list_):
-        set_data = app_wr.rating_filter(data, n_ratings)
-        # colors the graph blue:
-        set_color = alt.value("#62a9b5")
-    else:
-        set_data = app_wr.call_boardgame_radio(
-            data, col, list_, no_of_ratings=n_ratings
-        ).explode("group")
+    # Counts per year, entire dataset if no elements selected:
+    grouped_data = app_wr.call_boardgame_counts(data, index, col, list_, n_ratings)
+    return serialize_chart(
+        count_template("group" in grouped_data.columns), {"counts": grouped_data}
+    )
+
+
+@app_ca.memoize()
+def count_template(grouped=False):
+    """
+    Compiles the bar chart of games published per year
+
+    :param grouped: bool, color by the 'group' column (default False)
+
+    :return: string of html template, see serialize_chart()
+    """
+
+    if grouped:
         # colors the graph according to elements selected:
         set_color = alt.Color("group:N", title=None, scale=alt.Scale(scheme="dark2"))
-    # removes extraneous columns:
-    reduced_data = app_wr.remove_columns(set_data)
-    reduced_data = reduced_data.drop(columns=["name"])
-
-    grouping_columns = ["year_published"]
-    if "group" in reduced_data.columns:
-        grouping_columns.append("group")
-    grouped_data = reduced_data.groupby(grouping_columns).count()
-    grouped_data.columns = ["count"]
-    grouped_data = grouped_data.reset_index()
+    else:
+        # colors the graph blue:
+        set_color = alt.value("#62a9b5")
     # create altair bar chart:
     count_plot = (
-        alt.Chart(grouped_data)
+        alt.Chart(named_data("counts"))
         .mark_bar()
         .encode(
             alt.X(
@@ -158,41 +254,46 @@ def count_plot_dates(data, col="category", list_=[], n_ratings=0):
         .configure(background="transparent")
         .configure_legend(titleFontSize=18, labelFontSize=13)
     )
-    return count_plot
+    return compile_chart(count_plot)
 
 
+@rendered
+@app_ca.memoize(unordered=("list_",))
 def rank_plot_density(
-    data, col="category", list_=[], year_in=1990, year_out=2010, n_ratings=0
+    data, index, col="category", list_=[], year_in=1990, year_out=2010, n_ratings=0
 ):
     """
     Creates altair graph of set column for set years
 
     :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
     :param col: string indicating which column (default 'category')
     :param list_: list of elements in column (default [])
     :param year_in: int of year to start filtering on (default 1990)
     :param year_out: int of year to stop filtering on (default 2010)
     :param n_ratings: int of number of minimum rating to filter (default 0)
 
-    :return out_plot: altair plot
+    :return: string of html of the altair plot
+    """
+
+    # Creates density and mean columns:
+    plot_data = app_wr.call_boardgame_density(
+        data, index, col, list_, year_in, year_out, n_ratings
+    )
+    return serialize_chart(density_template(), {"density": plot_data})
+
+
+@app_ca.memoize()
+def density_template():
+    """
+    Compiles the rating density chart with a row per group
+
+    :return: string of html template, see serialize_chart()
     """
 
-    # If no elements selected return entire dataset:
-    if not bool(list_):
-        plot_data = app_wr.call_boardgame_top_density(
-            data, col, year_in, year_out, n_ratings
-        )
-    else:
-        plot_data = app_wr.call_boardgame_radio(
-            data, col, list_, year_in, year_out, n_ratings
-        )
-    # Bins average rating:
-    plot_data = app_wr.bin_rating(plot_data)
-    # Creates density column:
-    plot_data = app_wr.density_transform(plot_data, col)
     # Creates altair density chart:
     rank_plot = (
-        alt.Chart(plot_data, height=80)
+        alt.Chart(height=80)
         .mark_area(
             interpolate="monotone", fillOpacity=0.8, stroke="lightgray", strokeWidth=0.5
         )
@@ -215,11 +316,11 @@ def rank_plot_density(
     )
     # creates rule of mean average rating:
     avg_line = (
-        alt.Chart(plot_data)
+        alt.Chart()
         .mark_rule(color="black")
         .encode(
-            x=alt.X("mean", title="Average Rating"),
-            fill=alt.Fill("group", legend=None),
+            x=alt.X("mean:Q", title="Average Rating"),
+            fill=alt.Fill("group:N", legend=None),
             tooltip=[
                 alt.Tooltip("group:N", title="Group"),
                 alt.Tooltip("mean:Q", title="Mean"),
@@ -228,7 +329,7 @@ def rank_plot_density(
     )
     # combines density and rule chart:
     out_plot = (
-        (rank_plot + avg_line)
+        alt.layer(rank_plot, avg_line, data=named_data("density"))
         .facet(
             row=alt.Row(
                 "group:N",
@@ -242,31 +343,43 @@ def rank_plot_density(
         .configure_facet(spacing=0)
         .configure_view(stroke=None, strokeOpacity=0)
     )
-    return out_plot
+    return compile_chart(out_plot)
 
 
-def top_n_plot(data, cat=[None], mech=[None], pub=[None], n=10, n_ratings=0):
+@rendered
+@app_ca.memoize(unordered=("cat", "mech", "pub"))
+def top_n_plot(data, index, cat=[None], mech=[None], pub=[None], n=10, n_ratings=0):
     """
     Creates altair graph for top "n" games with filtered data
 
     :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
     :param cat: list of elements in category (default [None])
     :param mech: list of elements in mechanic (default [None])
     :param pub: list of elements in publisher (default [None])
     :param n: int of maximum games to call (default 10)
     :param n_ratings: int of number of minimum rating to filter (default 0)
 
-    :return out_plot: altair plot
+    :return: string of html of the altair plot
     """
 
-    # Need to disable max rows in case of showing entire dataset:
-    alt.data_transformers.disable_max_rows()
     # Filters data:
-    plot_data = app_wr.call_boardgame_filter(data, cat, mech, pub, n, n_ratings)
+    plot_data = app_wr.call_boardgame_filter(data, index, cat, mech, pub, n, n_ratings)
+    plot_data = plot_data[["name", "average_rating", "users_rated"]]
+    return serialize_chart(top_n_template(), {"top": plot_data})
+
+
+@app_ca.memoize()
+def top_n_template():
+    """
+    Compiles the bar chart of the top rated games
+
+    :return: string of html template, see serialize_chart()
+    """
 
     # Create altair bar chart:
     top_plot = (
-        alt.Chart(plot_data)
+        alt.Chart()
         .mark_bar()
         .encode(
             alt.X(
@@ -292,8 +405,8 @@ def top_n_plot(data, cat=[None], mech=[None], pub=[None], n=10, n_ratings=0):
                 scale=alt.Scale(scheme="dark2"),
             ),
             tooltip=[
-                alt.Tooltip("name", title="Name"),
-                alt.Tooltip("users_rated", title="# of Ratings"),
+                alt.Tooltip("name:N", title="Name"),
+                alt.Tooltip("users_rated:Q", title="# of Ratings"),
             ],
         )
         .properties(
@@ -307,27 +420,38 @@ def top_n_plot(data, cat=[None], mech=[None], pub=[None], n=10, n_ratings=0):
     )
     # Combine bar and text charts:
     out_plot = (
-        (top_plot + top_text)
+        alt.layer(top_plot, top_text, data=named_data("top"))
         .configure(background="transparent")
         .configure_legend(titleFontSize=15, labelFontSize=13, titleFontWeight=100)
         .configure_view(strokeOpacity=0)
     )
-    return out_plot
+    return compile_chart(out_plot)
+
 
+# corresponds with dark2 palette:
+# had trouble manually setting color palette for graph_object:
+COLOR_LIST = [
+    "#1b9e77",
+    "#d95f02",
+    "#7570b3",
+    "#e7298a",
+    "#66a61e",
+    "#e6ab02",
+    "#a6761d",
+    "#666666",
+]
 
-def graph_3D(data, col="category", list_=[None], game=None, extents=None):
+
+@app_ca.memoize()
+def graph_3D_layout(extents):
     """
-    3D t-sne graph data output
+    Layout of the 3D t-sne graph, the same for every figure
 
-    :param data: a pandas df generated from app_wrangling.call_boardgame_data()
-    :param col: string indicating which column (default 'category')
-    :param list_: list of elements in column (default [None])
-    :param game: string of board game name (default None)
-    :param extents: string (default None)
+    :param extents: dict of the min and max of the x, y and z coordinates
 
-    :return fig_out: 3D plotly figure
+    :return: plotly layout
     """
-    # layout for the 3D plot:
+
     axis_x = dict(
         title="",
         showgrid=True,
@@ -341,89 +465,261 @@ def graph_3D(data, col="category", list_=[None], game=None, extents=None):
     axis_z = axis_x.copy()
     axis_z["range"] = [extents["min_z"], extents["max_z"]]
 
-    layout_out = go.Layout(
+    return go.Layout(
         margin=dict(l=0, r=0, b=0, t=0),
         scene=dict(xaxis=axis_x, yaxis=axis_y, zaxis=axis_z),
         legend=dict(yanchor="top", y=0.93, xanchor="right", x=0.99),
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
+        # keeps the camera when the traces are updated:
+        uirevision="tsne",
     )
 
-    # plotting data:
-    if (list_ == [None]) or (not list_):
-        set_data = data.copy(deep=True)
-        set_data["group"] = "none"
-    else:
-        set_data = app_wr.call_boardgame_radio(data, col, list_).explode("group")
 
-    data_out = []
-    # corresponds with dark2 palette:
-    # had trouble manually setting color palette for graph_object:
-    color_list = [
-        "#1b9e77",
-        "#d95f02",
-        "#7570b3",
-        "#e7298a",
-        "#66a61e",
-        "#e6ab02",
-        "#a6761d",
-        "#666666",
-    ]
-    i = 0
-    for idx, val in set_data.groupby(set_data.group):
-        if idx == "none":
-            marker_style = dict(
-                size=val["average_rating"] * 1.6,
-                symbol="circle",
-                opacity=0.1,
-                color="grey",
-            )
-            legend_show = False
+@app_ca.memoize(unordered=("list_",))
+def graph_3D_overlay(data, index, col="category", list_=[None]):
+    """
+    Traces of the selected games of the 3D t-sne graph, one per group
 
-        else:
-            marker_style = dict(
-                size=val["average_rating"] * 1.6,
-                symbol="circle",
-                opacity=0.4,
-                color=color_list[i],
-            )
-            legend_show = True
-            i += 1
-
-        scatter = go.Scatter3d(
-            name=idx,
-            x=val["x"],
-            y=val["y"],
-            z=val["z"],
-            mode="markers",
-            marker=marker_style,
-            text=val["name"],
-            hoverinfo="text+name",
-            showlegend=legend_show,
-        )
-        data_out.append(scatter)
+    :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
+    :param col: string indicating which column (default 'category')
+    :param list_: list of elements in column (default [None])
 
-    if game:
-        game_data = data[data["name"] == game]
+    :return: list of traces from subset_trace(), empty without a selection
+    """
+
+    if (list_ == [None]) or (not list_):
+        return []
+
+    data_out = []
+    # selected games by row:
+    rows, groups = app_wr.call_boardgame_groups(data, index, col, list_)
+    for i, group in enumerate(sorted(set(groups))):
         marker_style = dict(
-            size=game_data["average_rating"] * 1.6,
             symbol="circle",
-            opacity=1.0,
-            color="purple",
+            opacity=0.4,
+            color=COLOR_LIST[i % len(COLOR_LIST)],
+        )
+        data_out.append(
+            subset_trace(
+                rows[groups == group],
+                name=group,
+                marker=marker_style,
+                hoverinfo="text+name",
+                showlegend=True,
+            )
         )
+    return data_out
+
+
+@app_ca.memoize()
+def graph_3D_highlight(data, index, game=None):
+    """
+    Trace of the chosen game of the 3D t-sne graph
+
+    :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
+    :param game: string of board game name (default None)
+
+    :return: list of traces from subset_trace(), empty without a game
+    """
+
+    if not game:
+        return []
 
-        scatter = go.Scatter3d(
+    points = graph_3D_points(data, index)
+    marker_style = dict(
+        symbol="circle",
+        opacity=1.0,
+        color="purple",
+    )
+    return [
+        subset_trace(
+            np.flatnonzero(points["name"] == game),
             name=game,
-            x=game_data["x"],
-            y=game_data["y"],
-            z=game_data["z"],
-            mode="markers",
             marker=marker_style,
-            text=game_data["name"],
             hoverinfo="text",
         )
-        data_out.append(scatter)
+    ]
+
+
+@app_ca.memoize()
+def graph_3D_points(data, index):
+    """
+    Coordinates, marker sizes and names of every game for the 3D plot
+
+    :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
+
+    :return: dict of np.array, one entry per row of the data
+    """
+
+    return {
+        "x": data["x"].to_numpy(dtype=np.float32),
+        "y": data["y"].to_numpy(dtype=np.float32),
+        "z": data["z"].to_numpy(dtype=np.float32),
+        "size": (data["average_rating"] * 1.6).to_numpy(dtype=np.float32),
+        "name": data["name"].to_numpy(dtype=object),
+        "game_id": data["game_id"].to_numpy(dtype=np.int32),
+    }
+
+
+@app_ca.memoize()
+def graph_3D_background(data, index):
+    """
+    Grey trace of every game for the 3D plot without a selection
+
+    :param data: a pandas df generated from app_wrangling.call_boardgame_data()
+    :param index: dict generated from app_wrangling.call_boardgame_index()
+
+    :return: dict of a plotly scatter3d trace
+    """
+
+    marker_style = dict(
+        symbol="circle",
+        opacity=0.1,
+        color="grey",
+    )
+    return points_trace(
+        graph_3D_points(data, index),
+        name="none",
+        marker=marker_style,
+        hoverinfo="text+name",
+        showlegend=False,
+    )
+
 
-    fig_out = {"data": data_out, "layout": layout_out}
+def points_trace(points, marker, **trace):
+    """
+    Creates a 3D scatter trace of every game.
+
+    :param points: dict generated from graph_3D_points()
+    :param marker: dict of plotly marker style, sized by rating
+    :param trace: other plotly trace properties
+
+    :return: dict of a plotly scatter3d trace
+    """
+
+    return dict(
+        type="scatter3d",
+        mode="markers",
+        x=typed_array(points["x"]),
+        y=typed_array(points["y"]),
+        z=typed_array(points["z"]),
+        marker=dict(marker, size=typed_array(points["size"])),
+        text=points["name"].tolist(),
+        # reported back by clicks to look up the game:
+        customdata=typed_array(points["game_id"], "i4"),
+        **trace,
+    )
+
+
+def subset_trace(rows, marker, **trace):
+    """
+    Creates a 3D scatter trace of some of the games by their rows in
+    graph_3D_background(). The browser already holds the background,
+    assets/clientside.js takes the coordinates, sizes, names and ids
+    of the rows from it.
+
+    :param rows: np.array of int, rows of the games
+    :param marker: dict of plotly marker style, sized by rating
+    :param trace: other plotly trace properties
+
+    :return: dict of a partial plotly scatter3d trace with 'rows'
+    """
+
+    return dict(
+        type="scatter3d",
+        mode="markers",
+        rows=typed_array(rows, "i4"),
+        marker=marker,
+        **trace,
+    )
+
+
+def typed_array(values, dtype="f4"):
+    """
+    Encodes numbers as a base64 typed array, decoded in the browser
+    by assets/clientside.js.
+
+    :param values: np.array of numbers
+    :param dtype: string, little endian numpy type code (default 'f4')
+
+    :return: dict of 'dtype' and 'bdata'
+    """
+
+    values = np.ascontiguousarray(values, dtype="<" + dtype)
+    return {"dtype": dtype, "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
+
+
+def named_data(name):
+    """
+    Placeholder data of a chart template, filled in by render_chart().
+
+    :param name: string, name of the dataset
 
-    return fig_out
+    :return: altair url data
+    """
+
+    return alt.UrlData(url=DATA_PLACEHOLDER.format(name), format={"type": "json"})
+
+
+def compile_chart(chart):
+    """
+    Renders an altair chart built on named_data() placeholders to html.
+    Building and validating the chart happens once per template, later
+    requests only substitute their data with render_chart().
+
+    :param chart: altair plot
+
+    :return: string of html template
+    """
+
+    return chart.to_html()
+
+
+def serialize_chart(template, datasets):
+    """
+    Serializes the datasets of a chart template compiled by compile_chart()
+    with the pandas json encoder, to be filled in by render_chart().
+
+    :param template: string of html template
+    :param datasets: dict of dataset name to pandas data frame
+
+    :return: tuple of the template and dict of dataset name to
+        (hash, json bytes)
+    """
+
+    payloads = {}
+    for name, dataset in datasets.items():
+        payload = dataset.to_json(orient="records", date_format="iso").encode("utf-8")
+        payloads[name] = (hashlib.md5(payload).hexdigest(), payload)
+    return template, payloads
+
+
+def render_chart(template, payloads):
+    """
+    Fills the datasets of a chart serialized by serialize_chart(). Each
+    dataset is stored under the hash of its contents, the chart loads it
+    by url so the browser can cache datasets shared between charts and
+    updates. If the store isn't shared by every server process, see
+    app_datasets.SHARED_STORE, the datasets are inlined in the chart.
+
+    :param template: string of html template
+    :param payloads: dict of dataset name to (hash, json bytes)
+
+    :return: string of html for an Iframe srcDoc
+    """
+
+    for name, (key, payload) in payloads.items():
+        placeholder = DATA_PLACEHOLDER.format(name)
+        if app_ds.SHARED_STORE:
+            url = app_ds.store_dataset(payload, key)
+            template = template.replace('"{}"'.format(placeholder), json.dumps(url))
+        else:
+            template = template.replace(
+                DATA_URL_SPEC.format(placeholder),
+                '{{"values": {}}}'.format(payload.decode("utf-8")),
+            )
+    return template
@@ -2,22 +2,100 @@
 takes data from board_games.csv and changes it to a usable format for the app
 """
 
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+
 import pandas as pd
 import numpy as np
+from sklearn.neighbors import KDTree
+
+import app_caching as app_ca
+
+# Note that the paths are relative to the root folder due to deployment
+# files located in root:
+CSV_PATH = "./data/processed/bgg_data_tsne.csv"
+SNAPSHOT_PATH = "./data/processed/bgg_data_tsne.npz"
+# Most similar games by category and mechanic, from tsne_analysis.py:
+SIMILAR_PATH = "./data/processed/bgg_data_similar.npz"
+# Bump when the snapshot layout changes so stale snapshots are rebuilt:
+SNAPSHOT_VERSION = 2
+# Multi-label columns stored as a vocabulary plus CSR arrays:
+LABEL_COLUMNS = ["category", "mechanic", "publisher"]
+# Steps of the minimum number of ratings sliders, counts are
+# pre-aggregated for thresholds 0, 100, ..., 10000:
+RATING_STEP = 100
+RATING_STEPS = 101
+# Edges of the 0.5 wide average rating bins of the density chart,
+# bins are closed on the right as in `bin_rating()`:
+RATING_BIN_EDGES = np.arange(-0.25, 10.5, 0.5)
+RATING_BINS = len(RATING_BIN_EDGES) - 1
+# Filtered similar games queries scan the filtered games directly
+# when there are at most this many:
+SIMILAR_SCAN_ROWS = 4096
+# Number of games returned by a name search:
+SEARCH_RESULTS = 30
+# Number of values offered by a dropdown at a time:
+LABEL_RESULTS = 50
+
+
+def call_boardgame_data(
+    csv_path=CSV_PATH, snapshot_path=SNAPSHOT_PATH, similar_path=SIMILAR_PATH
+):
+    """
+    Returns data from board_game.csv formatted for use in functions.
+    The 'category', 'mechanic', 'publisher' values are not kept in the
+    data frame, they are stored in the index as a vocabulary plus
+    CSR offset/code arrays (see `encode_labels()`).
+
+    The parsed data is kept in a binary snapshot next to the csv which
+    is loaded instead of the csv as long as the csv is unchanged.
 
+    :param csv_path: string, path to the csv (default CSV_PATH)
+    :param snapshot_path: string, path to the snapshot (default SNAPSHOT_PATH)
+    :param similar_path: string, path to the similar games table
+        (default SIMILAR_PATH)
 
-def call_boardgame_data():
+    :return boardgame_data: a pandas data frame
+    :return boardgame_index: dict
+        generated from app_wrangling.call_boardgame_index()
     """
-    Returns data from board_game.csv formatted for use in functions
+
+    source_hash = file_hash(csv_path)
+    snapshot = load_snapshot(snapshot_path, source_hash)
+
+    if snapshot is None:
+        boardgame_data = read_boardgame_csv(csv_path)
+        labels = {col: encode_labels(boardgame_data.pop(col)) for col in LABEL_COLUMNS}
+        # A read only deployment still works, just without the snapshot:
+        try:
+            write_snapshot(boardgame_data, labels, snapshot_path, source_hash)
+        except OSError:
+            pass
+    else:
+        boardgame_data, labels = snapshot
+
+    boardgame_index = call_boardgame_index(boardgame_data, labels)
+    boardgame_index["similar"] = load_similar_table(similar_path, boardgame_data)
+
+    return boardgame_data, boardgame_index
+
+
+def read_boardgame_csv(csv_path=CSV_PATH):
+    """
+    Parses board_game.csv into the format used by the app,
     results in listed values for 'category', 'mechanic, 'publisher'
 
+    :param csv_path: string, path to the csv (default CSV_PATH)
+
     :return boardgame_data: a pandas data frame
     """
 
-    # Note that the path is relative to the root folder due to deployment
-    # files located in root:
     boardgame_data = pd.read_csv(
-        "./data/processed/bgg_data_tsne.csv",
+        csv_path,
         parse_dates=["year_published"],
         index_col=0,
     )
@@ -39,8 +117,748 @@ def call_boardgame_data():
     return boardgame_data
 
 
+def call_boardgame_index(data, labels):
+    """
+    Builds the lookup structures shared by the filtering and
+    graphing functions. Built once when the data is loaded.
+
+    :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param labels: dict of column name to labels
+        generated from app_wrangling.encode_labels()
+
+    :return index: dict
+    """
+
+    index = {
+        # Row labels of the full data, positions in here are row ids:
+        "rows": data.index,
+        "labels": labels,
+        # Row id of each game id, for looking up games picked in the plots:
+        "game_rows": dict(zip(data["game_id"].tolist(), range(len(data)))),
+    }
+
+    # Row ids sorted by publication year and by number of ratings so
+    # range filters are a binary search rather than a full scan:
+    year = data["year_published"].dt.year.to_numpy().astype(np.int32)
+    index["year_order"] = np.argsort(year, kind="stable").astype(np.int32)
+    index["year_sorted"] = year[index["year_order"]]
+    users_rated = data["users_rated"].to_numpy()
+    index["rating_order"] = np.argsort(users_rated, kind="stable").astype(np.int32)
+    index["rating_sorted"] = users_rated[index["rating_order"]]
+    index["year"] = year
+    index["users_rated"] = users_rated
+    # Row ids from highest to lowest average rating for top "n" queries:
+    index["rating_rank"] = np.argsort(
+        -data["average_rating"].to_numpy(), kind="stable"
+    ).astype(np.int32)
+
+    # Values of each multi-label column by frequency for the dropdowns:
+    index["vocab"] = {col: build_vocab_index(labels[col]) for col in labels}
+    # Word index of the names for the game search:
+    index["names"] = build_name_index(data["name"])
+    # Position of each row id in the rating order, to rank search results:
+    index["rating_position"] = np.argsort(index["rating_rank"]).astype(np.int32)
+
+    # Spatial index of the t-sne coordinates for similar games queries:
+    index["xyz"] = data[["x", "y", "z"]].to_numpy(dtype=np.float64)
+    index["xyz_tree"] = KDTree(index["xyz"])
+
+    # Rating statistics of all games by year for the overlay lines:
+    index["year_stats"] = build_year_stats(data)
+    index["counts"] = build_count_cube(
+        year, users_rated, data["average_rating"].to_numpy(), labels
+    )
+
+    # Density chart bin of each row, -1 outside the bins:
+    ratings = data["average_rating"].to_numpy()
+    index["rating_bin"] = np.where(
+        (ratings > RATING_BIN_EDGES[0]) & (ratings <= RATING_BIN_EDGES[-1]),
+        np.searchsorted(RATING_BIN_EDGES, ratings, side="left") - 1,
+        -1,
+    ).astype(np.int8)
+    index["histograms"] = build_rating_histograms(
+        year, users_rated, index["rating_bin"], ratings, labels
+    )
+
+    return index
+
+
+def build_name_index(names):
+    """
+    Builds the search index of the game names: the words of each
+    name with their vocabulary in sorted order for prefix searches.
+
+    :param names: pd.Series of str
+
+    :return name_index: dict
+    """
+
+    normalized = names.map(normalize_name)
+    words = encode_labels(normalized.map(lambda x: sorted(set(x.split()))))
+    word_order = np.argsort(words["vocab"].astype(str), kind="stable")
+
+    return {
+        "normalized": normalized.to_numpy(dtype=object),
+        "words": words,
+        # Vocabulary sorted for binary search and its codes:
+        "words_sorted": words["vocab"][word_order].astype(str),
+        "words_order": word_order.astype(np.int32),
+    }
+
+
+def build_vocab_index(labels):
+    """
+    Builds the search index of the values of a multi-label column,
+    ranked by the number of games with each value.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+
+    :return vocab_index: dict
+    """
+
+    counts = np.diff(labels["posting_offsets"])
+    # Most frequent values first, ties in alphabetical order:
+    order = np.lexsort((labels["vocab"].astype(str), -counts)).astype(np.int32)
+
+    return {
+        "counts": counts,
+        "order": order,
+        "position": np.argsort(order).astype(np.int32),
+        "names": build_name_index(pd.Series(labels["vocab"])),
+    }
+
+
+def normalize_name(name):
+    """
+    Lower cases a name and replaces punctuation with spaces.
+
+    :param name: string
+
+    :return: string, words separated by single spaces
+    """
+
+    return " ".join(re.findall(r"\w+", str(name).casefold()))
+
+
+def build_year_stats(data):
+    """
+    Computes the mean rating of all games by publication year.
+
+    :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+
+    :return year_stats: a pandas data frame with 'year_published'
+        and 'mean' columns
+    """
+
+    year_stats = (
+        data.groupby("year_published")["average_rating"]
+        .mean()
+        .to_frame("mean")
+        .reset_index()
+    )
+
+    return year_stats
+
+
+def build_count_cube(year, users_rated, ratings, labels):
+    """
+    Pre-aggregates the number of games by publication year and minimum
+    number of ratings slider step, for all games and per label value.
+    For all games the counts are dense suffix sums over the rating steps
+    so `total[year, step]` is the number of games with at least
+    `step * RATING_STEP` ratings.
+
+    Per label value only non-empty cells are stored, with the number of
+    games and the sum of their average ratings at exactly that year and
+    rating step, sorted by value, year and step. The cells of a value are
+    `cell_*[cell_offsets[code]:cell_offsets[code + 1]]`.
+
+    :param year: np.array of int, publication year of each row
+    :param users_rated: np.array of int, number of ratings of each row
+    :param ratings: np.array of float, average rating of each row
+    :param labels: dict of column name to labels
+        generated from app_wrangling.encode_labels()
+
+    :return cube: dict
+    """
+
+    year_min = int(year.min()) if len(year) else 0
+    n_years = int(year.max()) - year_min + 1 if len(year) else 0
+    year_idx = year - year_min
+    step = np.minimum(users_rated // RATING_STEP, RATING_STEPS - 1)
+
+    total = np.bincount(
+        year_idx * RATING_STEPS + step, minlength=n_years * RATING_STEPS
+    ).reshape(n_years, RATING_STEPS)
+
+    cube = {
+        "year_min": year_min,
+        "n_years": n_years,
+        "year_dates": pd.to_datetime(
+            (np.arange(n_years) + year_min).astype(str), format="%Y"
+        ),
+        "total": np.cumsum(total[:, ::-1], axis=1)[:, ::-1].astype(np.int32),
+        "labels": {},
+    }
+
+    for col, col_labels in labels.items():
+        item_rows = np.repeat(np.arange(len(year)), np.diff(col_labels["offsets"]))
+        keys = col_labels["codes"].astype(np.int64) * n_years + year_idx[item_rows]
+        keys = keys * RATING_STEPS + step[item_rows]
+        cells, cell_of_item = np.unique(keys, return_inverse=True)
+        cell_of_item = cell_of_item.ravel()
+        cell_codes = cells // (n_years * RATING_STEPS)
+        cell_offsets = np.zeros(len(col_labels["vocab"]) + 1, dtype=np.int32)
+        np.cumsum(
+            np.bincount(cell_codes, minlength=len(col_labels["vocab"])),
+            out=cell_offsets[1:],
+        )
+        cube["labels"][col] = {
+            "cell_offsets": cell_offsets,
+            "cell_codes": cell_codes.astype(np.int32),
+            "cell_years": (cells // RATING_STEPS % n_years).astype(np.int16),
+            "cell_steps": (cells % RATING_STEPS).astype(np.int16),
+            "cell_counts": np.bincount(cell_of_item).astype(np.int32),
+            "cell_sums": np.bincount(cell_of_item, weights=ratings[item_rows]),
+        }
+
+    return cube
+
+
+def cube_year_counts(cube, col, code, step):
+    """
+    Returns the number of games with a label value by year, for games
+    with at least `step * RATING_STEP` ratings.
+
+    :param cube: dict, generated from app_wrangling.build_count_cube()
+    :param col: string, column of the value
+    :param code: int, vocabulary code of the value
+    :param step: int, minimum number of ratings slider step
+
+    :return counts: np.array of int, one entry per year of the cube
+    """
+
+    col_cube = cube["labels"][col]
+    start, end = col_cube["cell_offsets"][code : code + 2]
+    keep = col_cube["cell_steps"][start:end] >= step
+    counts = np.bincount(
+        col_cube["cell_years"][start:end][keep],
+        col_cube["cell_counts"][start:end][keep],
+        minlength=cube["n_years"],
+    )
+
+    return counts.astype(np.int64)
+
+
+def build_rating_histograms(year, users_rated, rating_bin, ratings, labels):
+    """
+    Pre-aggregates the rating bin counts and rating sums of the games
+    with each label value, by publication year and minimum number of
+    ratings slider step.
+
+    Only non-empty cells are stored, sorted by value, year, step and bin.
+    The cells of a value are `cell_*[cell_offsets[code]:cell_offsets[code + 1]]`
+    so a year range is a binary search within them.
+
+    :param year: np.array of int, publication year of each row
+    :param users_rated: np.array of int, number of ratings of each row
+    :param rating_bin: np.array of int, rating bin of each row, -1 if none
+    :param ratings: np.array of float, average rating of each row
+    :param labels: dict of column name to labels
+        generated from app_wrangling.encode_labels()
+
+    :return histograms: dict of column name to dict
+    """
+
+    year_min = int(year.min()) if len(year) else 0
+    n_years = int(year.max()) - year_min + 1 if len(year) else 0
+    step = np.minimum(users_rated // RATING_STEP, RATING_STEPS - 1)
+
+    histograms = {}
+    for col, col_labels in labels.items():
+        item_rows = np.repeat(np.arange(len(year)), np.diff(col_labels["offsets"]))
+        binned = rating_bin[item_rows] >= 0
+        item_rows = item_rows[binned]
+        codes = col_labels["codes"][binned].astype(np.int64)
+        keys = codes * n_years + year[item_rows] - year_min
+        keys = keys * RATING_STEPS + step[item_rows]
+        keys = keys * RATING_BINS + rating_bin[item_rows]
+        cells, cell_of_item = np.unique(keys, return_inverse=True)
+        cell_of_item = cell_of_item.ravel()
+        cell_offsets = np.zeros(len(col_labels["vocab"]) + 1, dtype=np.int32)
+        np.cumsum(
+            np.bincount(
+                cells // (n_years * RATING_STEPS * RATING_BINS),
+                minlength=len(col_labels["vocab"]),
+            ),
+            out=cell_offsets[1:],
+        )
+        histograms[col] = {
+            "cell_offsets": cell_offsets,
+            "cell_years": (
+                cells // (RATING_STEPS * RATING_BINS) % n_years + year_min
+            ).astype(np.int32),
+            "cell_steps": (cells // RATING_BINS % RATING_STEPS).astype(np.int16),
+            "cell_bins": (cells % RATING_BINS).astype(np.int8),
+            "cell_counts": np.bincount(cell_of_item).astype(np.int32),
+            "cell_sums": np.bincount(cell_of_item, weights=ratings[item_rows]),
+        }
+
+    return histograms
+
+
+def row_positions(index, data):
+    """
+    Returns the row ids (positions in the full data) of the rows of `data`.
+
+    :param index: dict, generated from app_wrangling.call_boardgame_index()
+    :param data: pd.DataFrame, the full data or a subset of it
+
+    :return: np.array of int
+    """
+
+    if data.index is index["rows"]:
+        return np.arange(len(data))
+    return index["rows"].get_indexer(data.index)
+
+
+def load_similar_table(similar_path, data):
+    """
+    Loads the most similar games of every game precomputed by
+    tsne_analysis.py, by row of the data.
+
+    :param similar_path: string, path to the similar games table
+    :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+
+    :return similar: dict of 'rows', np.array of int (rows, k), row
+        of each similar game, -1 for none, and 'scores', np.array of
+        float (rows, k), None if there is no table
+    """
+
+    try:
+        with np.load(similar_path, allow_pickle=False) as table:
+            table_ids = table["game_id"]
+            neighbours = table["neighbours"]
+            scores = table["scores"]
+    except (OSError, KeyError):
+        return None
+
+    game_ids = pd.Index(data["game_id"])
+    # Table rows of the games in the data, and rows of their neighbours:
+    table_rows = pd.Index(table_ids).get_indexer(game_ids)
+    neighbour_rows = game_ids.get_indexer(neighbours.ravel()).reshape(neighbours.shape)
+
+    rows = np.full((len(data), neighbours.shape[1]), -1, dtype=np.int32)
+    similar_scores = np.zeros(rows.shape, dtype=np.float32)
+    found = table_rows >= 0
+    rows[found] = neighbour_rows[table_rows[found]]
+    similar_scores[found] = scores[table_rows[found]]
+
+    return {"rows": rows, "scores": similar_scores}
+
+
+def game_row(index, game_id):
+    """
+    Returns the row id of a game.
+
+    :param index: dict, generated from app_wrangling.call_boardgame_index()
+    :param game_id: int
+
+    :return: int, None if there is no game with this id
+    """
+
+    return index["game_rows"].get(game_id)
+
+
+def encode_labels(lists):
+    """
+    Converts a column of lists into a vocabulary plus CSR arrays.
+    The values of row i are `vocab[codes[offsets[i]:offsets[i + 1]]]`.
+    The vocabulary is in order of first appearance.
+
+    :param lists: pd.Series of lists of str
+
+    :return labels: dict
+        generated from app_wrangling.make_labels()
+    """
+
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    np.cumsum(lists.map(len).to_numpy(), out=offsets[1:])
+    items = np.array([item for row in lists for item in row], dtype=object)
+    codes, vocab = pd.factorize(items)
+
+    return make_labels(np.asarray(vocab, dtype=object), offsets, codes)
+
+
+def make_labels(vocab, offsets, codes):
+    """
+    Bundles the CSR arrays of a multi-label column together with
+    its inverted index: the sorted row ids containing each value,
+    stored as `posting_rows[posting_offsets[code]:posting_offsets[code + 1]]`.
+
+    :param vocab: np.array of str, the distinct values
+    :param offsets: np.array of int, start of each row's codes (length n + 1)
+    :param codes: np.array of int, vocabulary position of each value
+
+    :return labels: dict
+    """
+
+    offsets = offsets.astype(np.int32)
+    codes = codes.astype(np.int32)
+    n_rows = len(offsets) - 1
+
+    # Sorting unique (code, row) pairs groups the row ids by value:
+    item_rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(offsets))
+    pairs = np.unique(codes.astype(np.int64) * n_rows + item_rows)
+    posting_offsets = np.zeros(len(vocab) + 1, dtype=np.int32)
+    np.cumsum(
+        np.bincount(pairs // n_rows, minlength=len(vocab)), out=posting_offsets[1:]
+    )
+
+    return {
+        "vocab": vocab,
+        "offsets": offsets,
+        "codes": codes,
+        "lookup": {value: code for code, value in enumerate(vocab)},
+        "posting_offsets": posting_offsets,
+        "posting_rows": (pairs % n_rows).astype(np.int32),
+    }
+
+
+def label_codes(labels, list_):
+    """
+    Returns the vocabulary codes of a list of values, -1 if not present.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param list_: list of str
+
+    :return: np.array of int32
+    """
+
+    return np.array([labels["lookup"].get(x, -1) for x in list_], dtype=np.int32)
+
+
+def label_postings(labels, code):
+    """
+    Returns the sorted row ids containing a value.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param code: int, vocabulary code, -1 for a value not in the vocabulary
+
+    :return: np.array of int32
+    """
+
+    if code < 0:
+        return labels["posting_rows"][:0]
+    start, end = labels["posting_offsets"][code : code + 2]
+    return labels["posting_rows"][start:end]
+
+
+def label_mask(labels, list_, how="and"):
+    """
+    Finds the rows of the full data containing all ("and") or
+    any ("or") of the values in `list_` from the inverted index.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param list_: list of str, list of values to check for
+    :param how: string, "and" or "or" (default "and")
+
+    :return mask: np.array of bool, one entry per row of the full data
+    """
+
+    mask = np.zeros(len(labels["offsets"]) - 1, dtype=bool)
+
+    if how == "or":
+        for code in label_codes(labels, list_):
+            mask[label_postings(labels, code)] = True
+        return mask
+
+    mask[label_intersection(labels, list_)] = True
+
+    return mask
+
+
+def label_intersection(labels, list_):
+    """
+    Returns the sorted row ids containing all of the values in `list_`.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param list_: list of str, list of values to check for
+
+    :return common: np.array of int
+    """
+
+    postings = [label_postings(labels, code) for code in label_codes(labels, list_)]
+
+    # Matching all of no values is true for every row:
+    if not postings:
+        return np.arange(len(labels["offsets"]) - 1)
+    # Intersect starting from the rarest value to keep intermediates small:
+    postings.sort(key=len)
+    common = postings[0]
+    for posting in postings[1:]:
+        common = np.intersect1d(common, posting, assume_unique=True)
+
+    return common
+
+
+def explode_labels(labels, rows):
+    """
+    CSR equivalent of exploding a list column for a set of rows.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param rows: np.array of int, row ids
+
+    :return owner: np.array of int, position in `rows` each value belongs to
+    :return codes: np.array of int32, vocabulary code of each value
+    """
+
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = labels["offsets"][rows].astype(np.int64)
+    counts = labels["offsets"][rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), counts)
+    # Position of each value within its row, added to the row's start:
+    ends = np.cumsum(counts)
+    items = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+    items += np.repeat(starts, counts)
+
+    return owner, labels["codes"][items]
+
+
+def label_membership(labels, rows, list_):
+    """
+    Checks which of the values in `list_` each row contains.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param rows: np.array of int, row ids
+    :param list_: list of str, list of values to check for
+
+    :return hits: np.array of bool, shape (len(rows), len(list_))
+    """
+
+    hits = np.zeros((len(rows), len(list_)), dtype=bool)
+    # Column of each vocabulary code in the matrix, -1 if not selected:
+    columns = np.full(len(labels["vocab"]), -1, dtype=np.int64)
+    for i, code in enumerate(label_codes(labels, list_)):
+        if code >= 0:
+            columns[code] = i
+    owner, codes = explode_labels(labels, rows)
+    columns = columns[codes]
+    selected = columns >= 0
+    hits[owner[selected], columns[selected]] = True
+
+    return hits
+
+
+def group_pairs(labels, rows, list_):
+    """
+    Assigns rows to the selected values they contain, rows containing
+    all of the values (when more than one is selected) go to
+    'All Selected' instead.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param rows: np.array of int, row ids
+    :param list_: list of str, list of values to check for
+
+    :return owner: np.array of int, position in `rows` of each pair
+    :return groups: np.array of str, group of each pair
+    """
+
+    values = list(dict.fromkeys(list_))
+    hits = label_membership(labels, rows, values + ["All Selected"])
+    hits[:, -1] = False
+    if len(list_) > 1:
+        hits[:, -1] = hits[:, :-1].all(axis=1)
+        hits[hits[:, -1], :-1] = False
+    # Row major order keeps each row's groups together in selection order:
+    owner, which = np.nonzero(hits)
+
+    return owner, np.array(values + ["All Selected"], dtype=object)[which]
+
+
+def label_lists(labels, rows):
+    """
+    Returns the values of a multi-label column as lists for a set of rows.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param rows: np.array of int, row ids
+
+    :return: list of lists of str
+    """
+
+    offsets = labels["offsets"]
+    vocab = labels["vocab"]
+    codes = labels["codes"]
+    return [list(vocab[codes[offsets[r] : offsets[r + 1]]]) for r in rows]
+
+
+def file_hash(path):
+    """
+    Hashes the contents of a file, used to detect a changed csv.
+
+    :param path: string, path to the file
+
+    :return: string, hex digest of the file contents
+    """
+
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_strings(values):
+    """
+    Packs strings into a single utf-8 buffer plus character offsets
+    so they can be stored without pickling.
+
+    :param values: list of str
+
+    :return text: np.array of uint8, utf-8 encoded concatenated strings
+    :return offsets: np.array of int64, start of each string (length n + 1)
+    """
+
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    text = np.frombuffer("".join(values).encode("utf-8"), dtype=np.uint8)
+    return text, offsets
+
+
+def decode_strings(text, offsets):
+    """
+    Unpacks strings stored by `encode_strings()`.
+
+    :param text: np.array of uint8
+    :param offsets: np.array of int64
+
+    :return: list of str
+    """
+
+    joined = text.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return [joined[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def write_snapshot(data, labels, snapshot_path, source_hash):
+    """
+    Writes the formatted board game data to a binary .npz snapshot.
+    Numeric and date columns are stored as arrays, text columns as
+    packed strings and multi-label columns as their CSR arrays.
+
+    :param data: pd.DataFrame
+        generated from app_wrangling.read_boardgame_csv()
+    :param labels: dict of column name to labels
+        generated from app_wrangling.encode_labels()
+    :param snapshot_path: string, path to write to
+    :param source_hash: string, hash of the csv the data came from
+    """
+
+    arrays = {"index": data.index.to_numpy()}
+    kinds = {}
+    for col in data.columns:
+        series = data[col]
+        if series.dtype.kind in "biufcmM":
+            kinds[col] = "array"
+            arrays[col] = series.to_numpy()
+        else:
+            kinds[col] = "text"
+            nulls = series.isna().to_numpy()
+            items = ["" if null else str(x) for x, null in zip(series, nulls)]
+            arrays[col + "__text"], arrays[col + "__offsets"] = encode_strings(items)
+            arrays[col + "__null"] = nulls
+
+    for col, col_labels in labels.items():
+        vocab_text, vocab_offsets = encode_strings(list(col_labels["vocab"]))
+        arrays[col + "__vocab_text"] = vocab_text
+        arrays[col + "__vocab_offsets"] = vocab_offsets
+        arrays[col + "__offsets"] = col_labels["offsets"]
+        arrays[col + "__codes"] = col_labels["codes"]
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "source_hash": source_hash,
+        "index_name": data.index.name,
+        "columns": list(data.columns),
+        "kinds": kinds,
+        "labels": list(labels),
+    }
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    # Write to a uniquely named temporary file first so readers never see a
+    # partial snapshot and concurrent writers don't share a file:
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(snapshot_path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, snapshot_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_snapshot(snapshot_path, source_hash):
+    """
+    Loads board game data written by `write_snapshot()`.
+
+    :param snapshot_path: string, path to the snapshot
+    :param source_hash: string, hash of the current csv
+
+    :return boardgame_data: a pandas data frame
+    :return labels: dict of column name to labels
+        (None instead of both if the snapshot is missing or stale)
+    """
+
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        with np.load(snapshot_path, allow_pickle=False) as snapshot:
+            meta = json.loads(str(snapshot["meta"]))
+            if (meta["version"] != SNAPSHOT_VERSION) or (
+                meta["source_hash"] != source_hash
+            ):
+                return None
+
+            columns = {}
+            for col in meta["columns"]:
+                if meta["kinds"][col] == "array":
+                    columns[col] = snapshot[col]
+                    continue
+                items = decode_strings(
+                    snapshot[col + "__text"], snapshot[col + "__offsets"]
+                )
+                nulls = snapshot[col + "__null"]
+                columns[col] = [np.nan if null else x for x, null in zip(items, nulls)]
+
+            labels = {}
+            for col in meta["labels"]:
+                vocab = decode_strings(
+                    snapshot[col + "__vocab_text"], snapshot[col + "__vocab_offsets"]
+                )
+                labels[col] = make_labels(
+                    np.array(vocab, dtype=object),
+                    snapshot[col + "__offsets"],
+                    snapshot[col + "__codes"],
+                )
+            index = pd.Index(snapshot["index"], name=meta["index_name"])
+    except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+        # Corrupt, truncated or unreadable snapshot, fall back to the csv:
+        return None
+
+    boardgame_data = pd.DataFrame(columns, index=index, columns=meta["columns"])
+
+    return boardgame_data, labels
+
+
+@app_ca.memoize(unordered=("cat", "mech", "pub"))
 def call_boardgame_filter(
-    data, cat=[None], mech=[None], pub=[None], n=None, n_ratings=0
+    data, index, cat=[None], mech=[None], pub=[None], n=None, n_ratings=0
 ):
     """
     Returns board games filtered based on list of values in
@@ -50,6 +868,8 @@ def call_boardgame_filter(
 
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param cat: list of str, list of categories (default [None])
     :param mech: list of str, list of mechanics (default [None])
     :param pub: list of str, list of publishers (default [None])
@@ -61,73 +881,169 @@ def call_boardgame_filter(
     :return boardgame_data: a pandas data frame
     """
 
-    # Copy data, deep required as contains lists:
-    boardgame_data = data.copy(deep=True)
+    keep = filter_mask(data, index, cat, mech, pub, n_ratings)
+
+    # Returns games in descending average rating, top "n" games if applicable:
+    if data.index is index["rows"]:
+        return select_rows(data, top_rows(index["rating_rank"], keep, n))
+
+    # A subset of the data isn't covered by the rating order, sort it instead:
+    matched = np.flatnonzero(keep)
+    order = np.argsort(-data["average_rating"].to_numpy()[matched], kind="stable")
+    if n:
+        order = order[:n]
+
+    return select_rows(data, matched[order])
+
+
+def filter_mask(data, index, cat=[None], mech=[None], pub=[None], n_ratings=0):
+    """
+    Finds the rows of `data` matching all of the values in
+    'category', 'mechanic', 'publisher' columns. A column
+    matching none of the rated games is ignored on its own,
+    the other columns still apply.
+
+    :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param cat: list of str, list of categories (default [None])
+    :param mech: list of str, list of mechanics (default [None])
+    :param pub: list of str, list of publishers (default [None])
+    :param n_rating: int, optional (default None)
+        minimum number of ratings to filter on
+
+    :return keep: np.array of bool, one entry per row of `data`
+    """
+
+    rows = row_positions(index, data)
     # Filter based on minimum number of ratings:
-    boardgame_data = rating_filter(boardgame_data, n_ratings)
+    rated = rating_mask(data, index, n_ratings)
+    keep = rated.copy()
     # Create dictionary based on user input lists:
     columns = {"category": cat, "mechanic": mech, "publisher": pub}
-    # Creates a list of bool series for each column:
-    columns_bool = [
-        call_bool_series_and(boardgame_data, key, columns[key]) for key in columns
-    ]
-
-    # Remove rows that aren't matched:
-    boardgame_data = boardgame_data[
-        (columns_bool[0] & columns_bool[1] & columns_bool[2])
-    ]
-
-    # Sorts by average rating and returns top "n" games if applicable:
-    boardgame_data = boardgame_data.sort_values("average_rating", ascending=False)
-    if n:
-        boardgame_data = boardgame_data[:n]
+    # Remove rows that aren't matched. Each column on its own is ignored if it
+    # matches none of the rated games, the remaining columns all apply:
+    for key in columns:
+        col_keep = label_mask(index["labels"][key], list(columns[key]))[rows]
+        if (col_keep & rated).any():
+            keep &= col_keep
 
-    return boardgame_data
+    return keep
 
 
-def call_bool_series_and(data, col, list_):
+@app_ca.memoize(unordered=("cat", "mech", "pub"))
+def call_game_search(
+    data, index, search="", cat=[None], mech=[None], pub=[None], n=SEARCH_RESULTS
+):
     """
-    Takes filter entries and creates bool series to filter dataframe on.
-    Logic is based on matching all entries.
-    However, if no values in the column are True, then all values changed to True.
+    Returns the board games whose name best matches a search among
+    the games filtered as in `call_boardgame_filter()`. Names with
+    words starting with every searched word come first, names
+    starting with the search before the others, then by descending
+    average rating.
 
-    :param data: pd.DataFrame,
+    :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
-    :param col: string, column name to apply function to
-    :param list_: list of str, list of values to check for
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param search: string, optional (default "")
+        the highest rated games are returned without a search
+    :param cat: list of str, list of categories (default [None])
+    :param mech: list of str, list of mechanics (default [None])
+    :param pub: list of str, list of publishers (default [None])
+    :param n: int, number of games to return (default SEARCH_RESULTS)
 
-    :return list_bool: list of class bool
+    :return boardgame_data: a pandas data frame
     """
 
-    list_bool = data[col].apply(lambda x: all(item in x for item in list_))
+    # Filter mask over the full data, which the name indexes cover:
+    keep = np.zeros(len(index["rows"]), dtype=bool)
+    keep[row_positions(index, data)] = filter_mask(data, index, cat, mech, pub)
 
-    # If no True values in entire list, switch all values to True:
-    if list_bool.sum() == 0:
-        list_bool = ~list_bool
+    query = normalize_name(search or "")
+    if not query:
+        return data.loc[index["rows"][top_rows(index["rating_rank"], keep, n)]]
 
-    return list_bool
+    found = name_prefix_rows(index["names"], query, keep, index["rating_position"])
 
+    return data.loc[index["rows"][found[:n]]]
 
-def call_bool_series_or(data, col, list_):
+
+def name_prefix_rows(names, query, keep, position):
     """
-    Takes filter entries and creates bool series to filter dataframe on.
-    Logic is based on matching one of entries.
+    Returns the rows with names having words starting with every word
+    of a search, names starting with the search first, then by
+    `position`.
 
-    :param data: pd.DataFrame
-        generated from app_wrangling.call_boardgame_data()
-    :param col: string, column name to apply function to
-    :param list_: list of str, list of values to check for
+    :param names: dict, generated from app_wrangling.build_name_index()
+    :param query: string, generated from app_wrangling.normalize_name()
+    :param keep: np.array of bool, filter mask over all names
+    :param position: np.array of int, rank of each name, lowest first
+
+    :return: np.array of int, row ids
+    """
 
-    :return list_bool: list of class bool
+    found = None
+    for word in query.split():
+        # Vocabulary words starting with the word are a range of the sorted words:
+        start = np.searchsorted(names["words_sorted"], word, side="left")
+        end = np.searchsorted(names["words_sorted"], word + "\U0010ffff", side="left")
+        codes = names["words_order"][start:end]
+        rows = [label_postings(names["words"], code) for code in codes]
+        rows = np.unique(np.concatenate(rows)) if rows else codes[:0]
+        found = rows if found is None else np.intersect1d(found, rows)
+
+    found = found[keep[found]]
+    starts = np.array(
+        [not name.startswith(query) for name in names["normalized"][found]], dtype=bool
+    )
+    order = np.lexsort((position[found], starts))
+
+    return found[order]
+
+
+def top_rows(order, keep, n=None):
     """
+    Walks a precomputed row order and returns the first `n` rows
+    that pass the filter mask, without sorting the matched rows.
+    The order is walked in chunks so a dense filter stops early.
 
-    list_bool = data[col].apply(lambda x: any(item in x for item in list_))
+    :param order: np.array of int, row ids in the order to return them
+    :param keep: np.array of bool, filter mask over all rows
+    :param n: int, optional (default None)
+        number of rows to return, all matching rows if None
 
-    return list_bool
+    :return: np.array of int, row ids
+    """
 
+    if not n:
+        return order[keep[order]]
 
+    found = []
+    n_found = 0
+    chunk = max(4 * n, 1024)
+    for start in range(0, len(order), chunk):
+        part = order[start : start + chunk]
+        part = part[keep[part]]
+        found.append(part)
+        n_found += len(part)
+        if n_found >= n:
+            break
+
+    return np.concatenate(found)[:n] if found else order[:0]
+
+
+@app_ca.memoize(unordered=("list_",))
 def call_boardgame_radio(
-    data, col, list_, year_in=1900, year_out=2200, no_of_ratings=0
+    data,
+    index,
+    col,
+    list_,
+    year_in=1900,
+    year_out=2200,
+    no_of_ratings=0,
+    columns=None,
 ):
     """
     Returns filtered data based on selecting
@@ -136,107 +1052,164 @@ def call_boardgame_radio(
 
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param col: string, column to filter on
     :param list_: list of str, list of values to check for
     :param year_in: int, year to start filtering on (default 1900)
     :param year_out: int, year to end filtering on (default 2200)
     :param no_of_ratings: int, (default 0)
         minimum number of ratings to filter on
+    :param columns: list of str, optional (default None)
+        columns to return, all columns if None
 
-    :return boardgame_date: a pandas data frame
+    :return boardgame_date: a pandas data frame,
+        one row per boardgame and group
     """
 
-    boardgame_data = data.copy(deep=True)
-    # filters data based on years provided
-    boardgame_data = year_filter(boardgame_data, year_in, year_out)
-    # filter data based on minimum number of ratings
-    boardgame_data = rating_filter(boardgame_data, no_of_ratings)
-    # subset based on user selection
-    boardgame_data = boardgame_data[call_bool_series_or(boardgame_data, col, list_)]
-    # call form_group() to add group column
-    boardgame_data = form_group(boardgame_data, col, list_)
-    # remove all entries that aren't part of a group
-    boardgame_data = boardgame_data[boardgame_data["group"] != ""]
+    # groups shared between charts with the same selection:
+    owner, groups = call_boardgame_groups(data, index, col, list_, no_of_ratings)
+    # filters data based on years
+    in_years = year_mask(data, index, year_in, year_out)[owner]
+    boardgame_data = select_rows(data, owner[in_years], columns)
+    boardgame_data = boardgame_data.assign(group=groups[in_years])
 
     return boardgame_data
 
 
-def helper_form_group(x, user_list):
-    """
-    Helper function to check if all values in user list are met.
-
-    :param x: list
-    :param user_list: list
-
-    Return "All Selected' if all met.
-    """
-
-    if all(item in x for item in user_list):
-        return ["All Selected"]
-    else:
-        return x
-
-
-def form_group(data, col, list_):
+@app_ca.memoize()
+def call_boardgame_groups(data, index, col, list_, no_of_ratings=0):
     """
-    This takes the selected filter and populates a group column
-    indicating which selected values a boardgame has.
+    Assigns the games with a minimum number of ratings to the selected
+    values of 'category', 'mechanic', or 'publisher' they contain.
+    Computed once per selection and shared by the charts, which each
+    add their own year range in `call_boardgame_radio()`.
 
     :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param col: string, column to filter on
     :param list_: list of str, list of values to check for
+    :param no_of_ratings: int, (default 0)
+        minimum number of ratings to filter on
 
-    :return data: a pandas data frame
+    :return owner: np.array of int, position in `data` of each pair
+    :return groups: np.array of str, group of each pair
     """
 
-    # takes column and forms new one with appropriate groups based on matching
-    data["group"] = data[col].apply(lambda x: list(set(x).intersection(set(list_))))
-
-    # replaces groups containing all items with 'All Selected'
-    if len(list_) > 1:
-        data["group"] = data["group"].apply(lambda x: helper_form_group(x, list_))
+    rows = row_positions(index, data)
+    # filters data based on minimum number of ratings
+    keep = rating_mask(data, index, no_of_ratings)
+    # subset based on user selection
+    keep &= label_mask(index["labels"][col], list(list_), how="or")[rows]
+    keep = np.flatnonzero(keep)
+    owner, groups = group_pairs(index["labels"][col], rows[keep], list(list_))
 
-    return data
+    return keep[owner], groups
 
 
-def count_group(data):
+@app_ca.memoize(unordered=("list_",))
+def call_boardgame_counts(data, index, col, list_, no_of_ratings=0):
     """
-    Provides group counts after `call_boardgame_radio()` is used.
+    Counts games published per year for the published count bar chart.
+    Games are counted per selected value they contain, games containing
+    all selected values are only counted in 'All Selected'.
+
+    For the slider's rating steps the counts come from the count cube
+    built by `build_count_cube()`, otherwise the filtered data is grouped.
 
     :param data: pd.DataFrame
-        generated from app_wrangling.call_boardgame_radio()
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param col: string, column to filter on
+    :param list_: list of str, list of values to check for
+    :param no_of_ratings: int, (default 0)
+        minimum number of ratings to filter on
 
-    :return data: a pandas data frame
+    :return grouped_data: a pandas data frame
     """
 
-    df_out = data.copy(deep=True)
-    # explode dataframe, group, and count to new df
-    df_out = df_out.explode("group")
-    df_out = pd.DataFrame(df_out.groupby(["year_published", "group"]).game_id.count())
-    # rearrange df
-    df_out = df_out.unstack().droplevel(0, axis=1)
-
-    # if 'All Selected' exists add counts to other categories
-    if "All Selected" in df_out.columns:
-        # create series from 'All Selected'
-        all_addition = df_out["All Selected"].fillna(0)
-        # add counts from 'All Selected to each group'
-        revised_columns = df_out.drop(columns=["All Selected"]).apply(
-            lambda x: x + all_addition.values
+    no_selection = (list_ == [None]) or (not list_)
+
+    # Thresholds between slider steps or a subset of the data are grouped:
+    step, remainder = divmod(no_of_ratings, RATING_STEP)
+    if remainder or not (0 <= step < RATING_STEPS) or data.index is not index["rows"]:
+        if no_selection:
+            set_data = select_rows(
+                data, rating_mask(data, index, no_of_ratings), ["year_published"]
+            )
+        else:
+            set_data = call_boardgame_radio(
+                data,
+                index,
+                col,
+                list_,
+                no_of_ratings=no_of_ratings,
+                columns=["year_published"],
+            )
+        grouping_columns = ["year_published"]
+        if "group" in set_data.columns:
+            grouping_columns.append("group")
+        return set_data.groupby(grouping_columns).size().to_frame("count").reset_index()
+
+    cube = index["counts"]
+
+    if no_selection:
+        group_counts = {None: cube["total"][:, step]}
+    else:
+        labels = index["labels"][col]
+        values = list(dict.fromkeys(list_))
+        group_counts = {}
+        for value, code in zip(values, label_codes(labels, values)):
+            counts = np.zeros(cube["n_years"], dtype=np.int64)
+            if code >= 0:
+                counts = cube_year_counts(cube, col, code, step)
+            group_counts[value] = counts
+        # Games with every selected value move from each value to 'All Selected':
+        if len(list_) > 1:
+            common = label_intersection(labels, values)
+            common = common[index["users_rated"][common] >= no_of_ratings]
+            all_counts = np.bincount(
+                index["year"][common] - cube["year_min"], minlength=cube["n_years"]
+            )
+            group_counts = {k: v - all_counts for k, v in group_counts.items()}
+            group_counts["All Selected"] = all_counts
+
+    grouped_data = []
+    for group, counts in group_counts.items():
+        present = counts > 0
+        group_data = pd.DataFrame(
+            {
+                "year_published": cube["year_dates"][present],
+                "count": counts[present],
+            }
         )
-        # create revised df
-        df_out = pd.concat([revised_columns, df_out[["All Selected"]]], axis=1)
+        if group is not None:
+            group_data.insert(1, "group", group)
+        grouped_data.append(group_data)
 
-    return df_out
+    grouped_data = pd.concat(grouped_data, ignore_index=True)
+    grouping_columns = [c for c in ["year_published", "group"] if c in grouped_data]
 
+    return grouped_data.sort_values(grouping_columns, ignore_index=True)
 
-def call_boardgame_top(data, col, year_in, year_out, no_of_ratings):
+
+@app_ca.memoize()
+def call_boardgame_top(data, index, col, year_in, year_out, no_of_ratings):
     """
     Creates dataframe with top 5 values by user rating in either
     'category', 'mechanic', or 'publisher'
 
+    For the slider's rating steps the mean ratings of every value come
+    from the cells built by `build_count_cube()`,
+    otherwise the filtered data is exploded and averaged.
+
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param col: string, column to filter on
     :param list_: list of str, list of values to check for
     :param year_in: int, year to start filtering on
@@ -247,40 +1220,195 @@ def call_boardgame_top(data, col, year_in, year_out, no_of_ratings):
     :return board_game_exp: a pandas data frame
     """
 
-    # Copy data, deep required as contains lists:
-    boardgame_data = data.copy(deep=True)
-    # Filters data based on years provided:
-    boardgame_data = year_filter(boardgame_data, year_in, year_out)
-    # Filter data based on minimum number of ratings:
-    boardgame_data = rating_filter(boardgame_data, no_of_ratings)
-    # Split up column into categorical values:
-    board_game_exp = boardgame_data.explode(col)
-    # Find the average rating for the top 5 categories:
-    board_game_exp = (
-        board_game_exp.groupby(col)["average_rating"]
-        .mean()
-        .sort_values(ascending=False)[:5]
-        .to_frame()
-        .reset_index()
-    )
+    labels = index["labels"][col]
+    # Thresholds between slider steps or a subset of the data are averaged:
+    step, remainder = divmod(no_of_ratings, RATING_STEP)
+    if remainder or not (0 <= step < RATING_STEPS) or data.index is not index["rows"]:
+        keep = year_mask(data, index, year_in, year_out)
+        keep = np.flatnonzero(keep & rating_mask(data, index, no_of_ratings))
+        owner, codes = explode_labels(labels, row_positions(index, data)[keep])
+        ratings = data["average_rating"].to_numpy()[keep][owner]
+        return top_means(labels, col, codes, ratings)
+
+    cube = index["counts"]
+    col_cube = cube["labels"][col]
+    # Totals of every value over its cells within the years and steps:
+    years = col_cube["cell_years"] + cube["year_min"]
+    keep = (years >= year_in) & (years <= year_out) & (col_cube["cell_steps"] >= step)
+    codes = col_cube["cell_codes"][keep]
+    n_codes = len(labels["vocab"])
+    counts = np.bincount(codes, col_cube["cell_counts"][keep], minlength=n_codes)
+    sums = np.bincount(codes, col_cube["cell_sums"][keep], minlength=n_codes)
+    present = np.flatnonzero(counts > 0)
+    means = sums[present] / counts[present]
+
+    # The sums carry rounding error, so every value close to the
+    # fifth best is averaged again from its games for an exact ranking:
+    if len(present) > 5:
+        fifth = np.partition(means, len(means) - 5)[len(means) - 5]
+        present = present[means >= fifth - 1e-6]
+    rows = [label_postings(labels, code) for code in present]
+    codes = np.repeat(present, [len(r) for r in rows])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32)
+    keep = (index["year"][rows] >= year_in) & (index["year"][rows] <= year_out)
+    keep &= index["users_rated"][rows] >= no_of_ratings
+    ratings = data["average_rating"].to_numpy()[rows[keep]]
+
+    return top_means(labels, col, codes[keep], ratings)
+
+
+def top_means(labels, col, codes, ratings):
+    """
+    Finds the 5 values with the highest mean rating.
+
+    :param labels: dict, generated from app_wrangling.make_labels()
+    :param col: string, name of the column
+    :param codes: np.array of int, vocabulary code of each value
+    :param ratings: np.array of float, rating of each value
+
+    :return board_game_exp: a pandas data frame
+    """
+
+    size = len(labels["vocab"])
+    counts = np.bincount(codes, minlength=size)
+    sums = np.bincount(codes, weights=ratings, minlength=size)
+    present = np.flatnonzero(counts > 0)
+    means = sums[present] / counts[present]
+    names = labels["vocab"][present]
+    # Highest mean first, ties in order of name:
+    top = np.lexsort((names, -means))[:5]
+    board_game_exp = pd.DataFrame({col: names[top], "average_rating": means[top]})
     return board_game_exp
 
 
-def subset_data(data, col):
+def call_similar_games(data, index, game_id, k=10, col=None, list_=None):
     """
-    Creates list of categories for column used to populate
-    dropdown menus
+    Finds the games closest to a game in the t-sne coordinates,
+    optionally only among games with any of the selected values of
+    'category', 'mechanic', or 'publisher'.
 
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
-    :param col: string, column generate list for
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param game_id: int, id of the game to find similar games for
+    :param k: int, number of similar games (default 10)
+    :param col: string, column to filter on (default None)
+    :param list_: list of str, list of values to check for (default None)
+
+    :return data: a pandas data frame with a 'distance' column,
+        from the closest game, empty if the game is unknown
+    """
+
+    row = game_row(index, game_id)
+    if row is None:
+        return data.iloc[:0].assign(distance=np.zeros(0))
+
+    if col and list_ and list_ != [None]:
+        rows, distances = nearest_rows(
+            index, row, k, label_mask(index["labels"][col], list(list_), how="or")
+        )
+    else:
+        rows, distances = nearest_rows(index, row, k)
+
+    return data.iloc[rows].assign(distance=distances)
+
 
-    :return list(exp_series.unique()): list of strings
+def call_recommended_games(data, index, game_id, k=5):
     """
+    Looks up the games sharing the most categories and mechanics with
+    a game in the table precomputed by tsne_analysis.py.
 
-    boardgame_data = data.copy(deep=True)
-    exp_series = boardgame_data[col].explode()
-    return list(exp_series.unique())
+    :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param game_id: int, id of the game to find similar games for
+    :param k: int, number of similar games (default 5)
+
+    :return data: a pandas data frame with a 'similarity' column,
+        from the most similar game, empty if the game is unknown
+    """
+
+    row = game_row(index, game_id)
+    similar = index.get("similar")
+    if row is None or similar is None:
+        return data.iloc[:0].assign(similarity=np.zeros(0))
+
+    rows = similar["rows"][row, :k]
+    keep = rows >= 0
+
+    return data.iloc[rows[keep]].assign(similarity=similar["scores"][row, :k][keep])
+
+
+def nearest_rows(index, row, k, mask=None):
+    """
+    Returns the rows closest to a row in the t-sne coordinates.
+
+    :param index: dict, generated from app_wrangling.call_boardgame_index()
+    :param row: int, row id of the game
+    :param k: int, number of rows to return
+    :param mask: np.array of bool, one entry per row of the full data,
+        rows allowed in the result (default None, all rows)
+
+    :return rows: np.array of int, row ids from the closest
+    :return distances: np.array of float
+    """
+
+    xyz = index["xyz"]
+    total = len(xyz)
+    allowed = total if mask is None else np.count_nonzero(mask)
+
+    if mask is not None and allowed <= SIMILAR_SCAN_ROWS:
+        # Few candidates, computing every distance is cheaper than the tree:
+        candidates = np.flatnonzero(mask)
+        candidates = candidates[candidates != row]
+        distances = np.sqrt(((xyz[candidates] - xyz[row]) ** 2).sum(axis=1))
+        order = np.lexsort((candidates, distances))[:k]
+        return candidates[order], distances[order]
+
+    # Enough neighbours to expect k allowed ones, grown until they are found:
+    query = min(total, (k + 1) * max(1, 2 * total // max(allowed, 1)))
+    while True:
+        distances, rows = index["xyz_tree"].query(xyz[row : row + 1], k=query)
+        distances, rows = distances[0], rows[0]
+        keep = rows != row
+        if mask is not None:
+            keep &= mask[rows]
+        if np.count_nonzero(keep) >= k or query == total:
+            return rows[keep][:k], distances[keep][:k]
+        query = min(total, query * 4)
+
+
+@app_ca.memoize()
+def call_label_options(index, col, search="", n=LABEL_RESULTS):
+    """
+    Returns the first `n` values of 'category', 'mechanic', or
+    'publisher' matching a search, most frequent first, to populate
+    dropdown menus. Values with words starting with every searched
+    word match, as in `call_game_search()`.
+
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param col: string, column to return values of
+    :param search: string, optional (default "")
+        all values are returned without a search
+    :param n: int, number of values to return (default LABEL_RESULTS)
+
+    :return: list of strings
+    """
+
+    labels = index["labels"][col]
+    vocab = index["vocab"][col]
+
+    query = normalize_name(search or "")
+    if not query:
+        codes = vocab["order"]
+    else:
+        keep = np.ones(len(labels["vocab"]), dtype=bool)
+        codes = name_prefix_rows(vocab["names"], query, keep, vocab["position"])
+
+    return list(labels["vocab"][codes[:n]])
 
 
 def remove_columns(data):
@@ -290,92 +1418,216 @@ def remove_columns(data):
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
 
-    :return boardgame_data[keep]: a pandas data frame
+    :return data[keep]: a pandas data frame
     """
 
-    boardgame_data = data.copy(deep=True)
     keep = ["name", "year_published", "average_rating"]
-    if "group" in boardgame_data.columns:
+    if "group" in data.columns:
         keep.append("group")
 
-    return boardgame_data[keep]
+    return data[keep]
 
 
-def call_boardgame_top_density(data, col, year_in, year_out, no_of_ratings):
+@app_ca.memoize(unordered=("list_",))
+def call_boardgame_density(
+    data, index, col, list_, year_in=1900, year_out=2200, no_of_ratings=0
+):
     """
-    Creates dataframe populated with all top 5 values by
-    user rating in either 'category', 'mechanic', or 'publisher'
+    Creates the average rating density of each selected value in either
+    'category', 'mechanic', or 'publisher' for the rating density chart.
+    Games containing all selected values are only counted in 'All Selected'.
+    Without a selection the top 5 values by user rating are shown,
+    over all games containing them.
+
+    For the slider's rating steps the densities come from the histograms
+    built by `build_rating_histograms()`, otherwise the filtered data is
+    binned.
 
     :param data: pd.DataFrame
         generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param col: string, column to filter on
-    :param year_in: int, start of time period (inclusive)
-    :param year_in: int, end of time period (inclusive)
-    :param no_of_ratings: int minimum number of ratings to filter on
+    :param list_: list of str, list of values to check for
+    :param year_in: int, year to start filtering on (default 1900)
+    :param year_out: int, year to end filtering on (default 2200)
+    :param no_of_ratings: int, (default 0)
+        minimum number of ratings to filter on
 
-    :return boardgame_data: a pandas data frame
+    :return chart_data: a pandas data frame
     """
 
-    boardgame_data = data.copy(deep=True)
+    if not list_:
+        list_ = call_boardgame_top(data, index, col, year_in, year_out, no_of_ratings)[
+            col
+        ].to_list()
+        # The top values are shown over all years and numbers of ratings:
+        year_in, year_out, no_of_ratings = -np.inf, np.inf, 0
+
+    # Thresholds between slider steps or a subset of the data are binned:
+    step, remainder = divmod(no_of_ratings, RATING_STEP)
+    if remainder or not (0 <= step < RATING_STEPS) or data.index is not index["rows"]:
+        columns = ["game_id", "average_rating"]
+        chart_data = call_boardgame_radio(
+            data, index, col, list_, year_in, year_out, no_of_ratings, columns
+        )
+        return density_transform(bin_rating(chart_data), col)
+
+    labels = index["labels"][col]
+    histograms = index["histograms"][col]
+    values = list(dict.fromkeys(list_))
+    group_bins = {}
+    for value, code in zip(values, label_codes(labels, values)):
+        counts, total = np.zeros(RATING_BINS), 0.0
+        if code >= 0:
+            start, end = histograms["cell_offsets"][code : code + 2]
+            years = histograms["cell_years"][start:end]
+            cells = slice(
+                start + np.searchsorted(years, year_in, side="left"),
+                start + np.searchsorted(years, year_out, side="right"),
+            )
+            keep = histograms["cell_steps"][cells] >= step
+            counts = np.bincount(
+                histograms["cell_bins"][cells][keep],
+                weights=histograms["cell_counts"][cells][keep],
+                minlength=RATING_BINS,
+            )
+            total = histograms["cell_sums"][cells][keep].sum()
+        group_bins[value] = (counts, total)
+    # Games with every selected value move from each value to 'All Selected':
+    if len(list_) > 1:
+        common = label_intersection(labels, values)
+        year = index["year"][common]
+        keep = (year >= year_in) & (year <= year_out)
+        keep &= index["users_rated"][common] >= no_of_ratings
+        common = common[keep & (index["rating_bin"][common] >= 0)]
+        all_counts = np.bincount(index["rating_bin"][common], minlength=RATING_BINS)
+        all_total = data["average_rating"].to_numpy()[common].sum()
+        group_bins = {
+            k: (counts - all_counts, total - all_total)
+            for k, (counts, total) in group_bins.items()
+        }
+        group_bins["All Selected"] = (all_counts, all_total)
+
+    names = sorted(k for k, (counts, total) in group_bins.items() if counts.sum() > 0)
+    density = np.zeros((len(names), RATING_BINS))
+    # The mean is only set on the first row of each group so the
+    # rule chart draws one line per group:
+    mean = np.full((len(names), RATING_BINS), np.nan)
+    for i, name in enumerate(names):
+        counts, total = group_bins[name]
+        density[i] = counts / counts.sum()
+        mean[i, 0] = total / counts.sum()
+
+    chart_data = pd.DataFrame(
+        {
+            "average_rating_bin": np.tile(np.arange(0, 10.5, 0.5), len(names)),
+            "group": np.repeat(np.array(names, dtype=object), RATING_BINS),
+            "density": density.ravel(),
+            "mean": mean.ravel(),
+        }
+    )
 
-    boardgame_list = call_boardgame_top(data, col, year_in, year_out, no_of_ratings)[
-        col
-    ].to_list()
+    return chart_data
 
-    boardgame_data = boardgame_data[
-        call_bool_series_or(boardgame_data, col, boardgame_list)
-    ]
 
-    boardgame_data = form_group(boardgame_data, col, boardgame_list)
-    boardgame_data = boardgame_data.explode("group")
+def year_rows(index, year_in, year_out):
+    """
+    Finds the row ids within a year range from the sorted year index
 
-    return boardgame_data
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param year_in: int, start of time period (inclusive)
+    :param year_in: int, end of time period (inclusive)
 
+    :return: np.array of int32, row ids in order of year
+    """
 
-def year_filter(data, year_in, year_out):
+    start = np.searchsorted(index["year_sorted"], year_in, side="left")
+    end = np.searchsorted(index["year_sorted"], year_out, side="right")
+    return index["year_order"][start:end]
+
+
+def year_mask(data, index, year_in, year_out):
     """
-    Limits pandas data frame by year range
+    Creates a boolean mask of the rows within a year range
 
     :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param year_in: int, start of time period (inclusive)
     :param year_in: int, end of time period (inclusive)
 
-    :return boardgame_data: a pandas data frame
+    :return: np.array of bool
     """
 
-    boardgame_data = data
-    # Turns year inputs to date time:
-    year_in = pd.to_datetime(year_in, format="%Y")
-    year_out = pd.to_datetime(year_out, format="%Y")
+    mask = np.zeros(len(index["rows"]), dtype=bool)
+    mask[year_rows(index, year_in, year_out)] = True
+    return mask[row_positions(index, data)]
 
-    # Create a boolean series to filter by start + end year:
-    year_filter = (boardgame_data["year_published"] >= year_in) & (
-        boardgame_data["year_published"] <= year_out
-    )
-    boardgame_data = boardgame_data[year_filter]
 
-    return boardgame_data
+def rating_rows(index, no_of_ratings):
+    """
+    Finds the row ids with a minimum number of ratings
+    from the sorted ratings index
 
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
+    :param no_of_ratings: int
+        minimum number of ratings to filter on
 
-def rating_filter(data, no_of_ratings):
+    :return: np.array of int32, row ids in order of number of ratings
     """
-    Limits pandas data frame by minimum
-    number of rating
+
+    start = np.searchsorted(index["rating_sorted"], no_of_ratings, side="left")
+    return index["rating_order"][start:]
+
+
+def rating_mask(data, index, no_of_ratings):
+    """
+    Creates a boolean mask of the rows with a minimum
+    number of ratings
 
     :param data: pd.DataFrame
+        generated from app_wrangling.call_boardgame_data()
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
     :param no_of_ratings: int
         minimum number of ratings to filter on
 
-    :return boardgame_data: a pandas data frame
+    :return: np.array of bool
     """
 
-    boardgame_data = data
+    mask = np.zeros(len(index["rows"]), dtype=bool)
+    mask[rating_rows(index, no_of_ratings)] = True
+    return mask[row_positions(index, data)]
 
-    # Create a boolean series to filter out number of ratings less than required:
-    rating_filter = boardgame_data["users_rated"] >= no_of_ratings
-    boardgame_data = boardgame_data[rating_filter]
 
-    return boardgame_data
+def select_rows(data, rows, columns=None):
+    """
+    Materializes selected rows and columns of a data frame in a
+    single copy, rather than copying the whole frame and then
+    subsetting it.
+
+    :param data: pd.DataFrame
+    :param rows: np.array of bool (mask) or int (positions)
+    :param columns: list of str, optional (default None)
+        columns to return, all columns if None
+
+    :return: a pandas data frame
+    """
+
+    rows = np.asarray(rows)
+    if rows.dtype == bool:
+        rows = np.flatnonzero(rows)
+    if columns is None:
+        return data.iloc[rows]
+
+    col_positions = data.columns.get_indexer(columns)
+    if (col_positions < 0).any():
+        raise KeyError([c for c, i in zip(columns, col_positions) if i < 0])
+    return data.iloc[rows, col_positions]
 
 
 def bin_rating(data):
@@ -390,14 +1642,56 @@ def bin_rating(data):
     bin_list = list(np.arange(-0.25, 10.5, 0.5))
     # List of bin labels:
     set_list = list(np.arange(0, 10.5, 0.5))
-    # Bins the average rating column:
-    data["average_rating_bin"] = pd.cut(
-        data["average_rating"], bins=bin_list, labels=set_list
+    # Bins the average rating column, on a new frame as data may be cached:
+    data = data.assign(
+        average_rating_bin=pd.cut(
+            data["average_rating"], bins=bin_list, labels=set_list
+        )
     )
 
     return data
 
 
+def bin_year_rating(data, rating_step=0.25):
+    """
+    Aggregates games into cells of publication year and average rating,
+    per group if there is a group column, for plotting many games.
+
+    :param data: pd.DataFrame, with 'year_published', 'average_rating'
+        and 'users_rated' columns
+    :param rating_step: float, width of the rating bins (default 0.25)
+
+    :return bins: a pandas data frame of the number of games per cell,
+        rated at the centre of the cell
+    :return sample: a pandas data frame,
+        the game with the most ratings in each cell
+    """
+
+    cells = data.assign(
+        rating_cell=(np.floor(data["average_rating"] / rating_step) + 0.5) * rating_step
+    )
+    keys = ["year_published", "rating_cell"]
+    if "group" in data.columns:
+        keys.append("group")
+
+    bins = (
+        cells.groupby(keys)
+        .size()
+        .to_frame("count")
+        .reset_index()
+        .rename(columns={"rating_cell": "average_rating"})
+    )
+    # Ties on the number of ratings keep the order of the data:
+    sample = (
+        cells.sort_values("users_rated", ascending=False, kind="stable")
+        .drop_duplicates(keys)
+        .sort_values(keys)
+        .drop(columns="rating_cell")
+    )
+
+    return bins, sample
+
+
 def density_transform(data, col):
     """
     Creates a density column for average ratings
@@ -413,7 +1707,7 @@ def density_transform(data, col):
     # Create density column:
     plot_density = (
         data_copy.explode("group")
-        .groupby(["average_rating_bin", "group"])[col]
+        .groupby(["average_rating_bin", "group"])["game_id"]
         .count()
         .to_frame("density")
         .reset_index()
@@ -434,9 +1728,14 @@ def density_transform(data, col):
 
     # Runs through each group and creates density:
     for x in names:
-        temp = plot_density[plot_density["group"] == x]
+        temp = plot_density[plot_density["group"] == x].copy()
         temp["density"] = temp["density"] / temp["density"].sum()
-        temp["mean"] = plot_mean[plot_mean["group"] == x]["average_rating"]
+        # The mean is only set on the first row of each group so the
+        # rule chart draws one line per group:
+        temp["mean"] = np.nan
+        temp.iloc[0, temp.columns.get_loc("mean")] = plot_mean.loc[
+            plot_mean["group"] == x, "average_rating"
+        ].iloc[0]
         chart_data.append(temp)
 
     # Puts back into single dataframe:
@@ -446,17 +1745,23 @@ def density_transform(data, col):
     return chart_data
 
 
-def clean_table(data):
+def clean_table(data, index):
     """
     Cleans the table on tab 2 including rounding and date formatting.
 
     :param data: pd.DataFrame
+    :param index: dict
+        generated from app_wrangling.call_boardgame_index()
 
     :return data: a pandas data frame
     """
+    # Work on a copy as data may be cached:
+    data = data.copy()
+    rows = row_positions(index, data)
     data["year_published"] = data["year_published"].dt.year
-    data["mechanic"] = [", ".join(map(str, item)) for item in data["mechanic"]]
-    data["publisher"] = [", ".join(map(str, item)) for item in data["publisher"]]
-    data["category"] = [", ".join(map(str, item)) for item in data["category"]]
+    for col in ["mechanic", "publisher", "category"]:
+        data[col] = [
+            ", ".join(item) for item in label_lists(index["labels"][col], rows)
+        ]
     data["average_rating"] = round(data["average_rating"], 2)
     return data
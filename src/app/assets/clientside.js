@@ -0,0 +1,144 @@
+// Clientside callbacks, see app.clientside_callback() in app.py
+
+var TYPED_ARRAYS = {
+    f4: Float32Array,
+    f8: Float64Array,
+    i1: Int8Array,
+    u1: Uint8Array,
+    i2: Int16Array,
+    u2: Uint16Array,
+    i4: Int32Array,
+    u4: Uint32Array,
+};
+
+// Decodes {dtype, bdata} base64 typed arrays written by
+// app_graphing.typed_array() anywhere within a figure.
+function decodeTypedArrays(value) {
+    if (Array.isArray(value)) {
+        return value.map(decodeTypedArrays);
+    }
+    if (value === null || typeof value !== "object") {
+        return value;
+    }
+    if (typeof value.bdata === "string" && value.dtype in TYPED_ARRAYS) {
+        var binary = atob(value.bdata);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new TYPED_ARRAYS[value.dtype](bytes.buffer);
+    }
+    var decoded = {};
+    for (var key in value) {
+        // Long hover text lists can't contain typed arrays:
+        if (key === "text") {
+            decoded[key] = value[key];
+        } else {
+            decoded[key] = decodeTypedArrays(value[key]);
+        }
+    }
+    return decoded;
+}
+
+// Decoded traces by the store data they came from, so traces that
+// didn't change keep their arrays between updates:
+var decodedTraces = new WeakMap();
+
+function decodeTrace(trace) {
+    if (!decodedTraces.has(trace)) {
+        decodedTraces.set(trace, decodeTypedArrays(trace));
+    }
+    return decodedTraces.get(trace);
+}
+
+// Traces from app_graphing.subset_trace() filled in with the values of
+// their rows in the background trace, by the store data they came from:
+var subsetTraces = new WeakMap();
+
+function gather(values, rows) {
+    var out = Array.isArray(values)
+        ? new Array(rows.length)
+        : new values.constructor(rows.length);
+    for (var i = 0; i < rows.length; i++) {
+        out[i] = values[rows[i]];
+    }
+    return out;
+}
+
+function subsetTrace(background, subset) {
+    var cached = subsetTraces.get(subset);
+    if (cached && cached.background === background) {
+        return cached.trace;
+    }
+    var decoded = decodeTrace(background);
+    var rows = decodeTrace(subset).rows;
+    var trace = Object.assign({}, subset);
+    delete trace.rows;
+    ["x", "y", "z", "text", "customdata"].forEach(function (key) {
+        trace[key] = gather(decoded[key], rows);
+    });
+    trace.marker = Object.assign({}, subset.marker, {
+        size: gather(decoded.marker.size, rows),
+    });
+    subsetTraces.set(subset, { background: background, trace: trace });
+    return trace;
+}
+
+// Store callback of a tab's first visit, set once and then left
+// alone so the tab's charts don't update again on later visits:
+function visitTab(tab) {
+    return function (activeTab, visited) {
+        if (activeTab !== tab || visited) {
+            return window.dash_clientside.no_update;
+        }
+        return true;
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    clientside: {
+        // Modals opened and closed by either of two buttons:
+        toggle_modal: function (nOpen, nClose, isOpen) {
+            if (nOpen || nClose) {
+                return !isOpen;
+            }
+            return isOpen;
+        },
+        // Popovers and collapses toggled by a button:
+        toggle_open: function (n, isOpen) {
+            if (n) {
+                return !isOpen;
+            }
+            return isOpen;
+        },
+        // Empties a dropdown when its radio selection changes:
+        clear_values: function () {
+            return [];
+        },
+        // Slider labels:
+        years_selected: function (value) {
+            return "Years Selected: " + value[0] + " to " + value[1];
+        },
+        min_ratings: function (value) {
+            return "Min Ratings: " + value;
+        },
+        visit_tab_1: visitTab("tab-1"),
+        visit_tab_2: visitTab("tab-2"),
+        visit_tab_3: visitTab("tab-3"),
+        // 3D plot figure from the traces in its stores, the grey
+        // background only shows without a selection:
+        assemble_figure: function (background, layout, overlay, highlight) {
+            if (!background || !layout) {
+                return window.dash_clientside.no_update;
+            }
+            var subsets = (overlay || []).concat(highlight || []);
+            var traces = subsets.map(function (subset) {
+                return subsetTrace(background, subset);
+            });
+            if (!overlay || !overlay.length) {
+                traces.unshift(decodeTrace(background));
+            }
+            return { data: traces, layout: layout };
+        },
+    },
+});
@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.preprocessing import scale
 from sklearn.preprocessing import MultiLabelBinarizer
 from sklearn.manifold import TSNE
@@ -93,6 +95,111 @@ def clean_data(data):
     return onehot_df, user_df
 
 
+def onehot_sparse(data):
+    """
+    Binary one-hot encoding of the category and mechanic features,
+    kept sparse for the similar games table.
+
+    data: pd.Dataframe, `boardgame_data_sub` output from `load_csv()`
+
+    return: onehot, scipy.sparse.csr_matrix of 0/1 with a row per game
+    return: features, np.array of str, feature of each column
+    """
+    binarizer = MultiLabelBinarizer(sparse_output=True)
+    category = binarizer.fit_transform(data.category)
+    category_features = ["category: " + c for c in binarizer.classes_]
+    binarizer = MultiLabelBinarizer(sparse_output=True)
+    mechanic = binarizer.fit_transform(data.mechanic)
+    mechanic_features = ["mechanic: " + c for c in binarizer.classes_]
+
+    onehot = sparse.hstack([category, mechanic], format="csr", dtype=np.float32)
+    features = np.array(category_features + mechanic_features)
+
+    return onehot, features
+
+
+def top_k_neighbours(onehot, k=10, metric="cosine", priority=None, block_size=256):
+    """
+    Finds the `k` most similar games of every game from their one-hot
+    features. Similarities are computed by sparse matrix products over
+    blocks of `block_size` games, so memory stays at `block_size` rows
+    of similarities whatever the number of games.
+
+    onehot: scipy.sparse.csr_matrix, output from `onehot_sparse()`
+    k: int, number of neighbours per game
+    metric: str, "cosine" or "jaccard"
+    priority: np.array, order of equally similar games, lowest first,
+        row order if None
+    block_size: int, number of games per block
+
+    return: neighbours, np.array of int (games, k), row of each
+        neighbour, -1 past the games sharing any feature
+    return: scores, np.array of float (games, k), similarity of each
+        neighbour
+    """
+    if metric not in ["cosine", "jaccard"]:
+        raise ValueError("metric must be 'cosine' or 'jaccard'")
+
+    onehot = sparse.csr_matrix(onehot, dtype=np.float32)
+    n_games = onehot.shape[0]
+    degree = np.asarray(onehot.sum(axis=1)).ravel()
+    if priority is None:
+        priority = np.arange(n_games)
+
+    neighbours = np.full((n_games, k), -1, dtype=np.int32)
+    scores = np.zeros((n_games, k), dtype=np.float32)
+
+    for start in range(0, n_games, block_size):
+        stop = min(start + block_size, n_games)
+        # number of shared features with every game:
+        shared = (onehot[start:stop] @ onehot.T).toarray()
+        if metric == "cosine":
+            union = np.sqrt(np.outer(degree[start:stop], degree))
+        else:
+            union = degree[start:stop, None] + degree[None, :] - shared
+        similarity = np.divide(
+            shared, union, out=np.zeros_like(shared), where=union > 0
+        )
+        # a game isn't its own neighbour:
+        similarity[np.arange(stop - start), np.arange(start, stop)] = 0
+
+        # k-th highest similarity per game, ties with it are ordered
+        # by priority:
+        kth = -np.partition(-similarity, k - 1, axis=1)[:, k - 1]
+        for i, row in enumerate(similarity):
+            candidates = np.flatnonzero((row >= kth[i]) & (row > 0))
+            order = np.lexsort((priority[candidates], -row[candidates]))[:k]
+            neighbours[start + i, : len(order)] = candidates[order]
+            scores[start + i, : len(order)] = row[candidates[order]]
+
+    return neighbours, scores
+
+
+def save_neighbours(filename, game_id, onehot, features, neighbours, scores):
+    """
+    Saves the sparse one-hot features and the similar games table,
+    loaded by the app to look up similar games.
+
+    filename: path to npz
+    game_id: np.array of int, game id of each row
+    onehot: scipy.sparse.csr_matrix, output from `onehot_sparse()`
+    features: np.array of str, output from `onehot_sparse()`
+    neighbours: np.array of int, output from `top_k_neighbours()`
+    scores: np.array of float, output from `top_k_neighbours()`
+    """
+    game_id = np.asarray(game_id)
+    np.savez_compressed(
+        filename,
+        game_id=game_id,
+        onehot_indptr=onehot.indptr,
+        onehot_indices=onehot.indices,
+        features=features,
+        # neighbours by game id, independent of the row order:
+        neighbours=np.where(neighbours >= 0, game_id[neighbours], -1),
+        scores=scores,
+    )
+
+
 def tsne_analyse(onehot_df, user_df):
     """
     Runs TSNE analysis and provides output.
@@ -131,6 +238,22 @@ if __name__ == "__main__":
     cat_mec, user = clean_data(mod)
     print("Data transformed successfully")
 
+    # precompute the most similar games from the sparse one-hot features
+    # more rated games come first between equally similar games
+    onehot, features = onehot_sparse(mod)
+    neighbours, scores = top_k_neighbours(
+        onehot, k=10, metric="cosine", priority=-mod["users_rated"].to_numpy()
+    )
+    save_neighbours(
+        "./data/processed/bgg_data_similar.npz",
+        mod["game_id"],
+        onehot,
+        features,
+        neighbours,
+        scores,
+    )
+    print("Similar games table saved")
+
     # run TSNE analysis
     result_cat, result_user = tsne_analyse(cat_mec, user)
     print("TSNE analysis complete")
@@ -0,0 +1,37 @@
+"""
+shared fixtures for the app tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app modules and scripts import each other by name and use paths
+# relative to the root folder, as when deployed:
+sys.path.insert(0, os.path.join(ROOT, "src", "app"))
+sys.path.insert(0, os.path.join(ROOT, "src", "scripts"))
+os.chdir(ROOT)
+
+import app_wrangling as app_wr  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def boardgame(tmp_path_factory):
+    """
+    :return: data and index from app_wrangling.call_boardgame_data(),
+        with the snapshot written to a temporary folder
+    """
+    snapshot_path = str(tmp_path_factory.mktemp("snapshot") / "bgg.npz")
+    return app_wr.call_boardgame_data(snapshot_path=snapshot_path)
+
+
+@pytest.fixture(scope="session")
+def reference_data():
+    """
+    :return: the csv parsed with plain pandas, as the app did before
+        the lookup index, with listed 'category', 'mechanic', 'publisher'
+    """
+    return app_wr.read_boardgame_csv()
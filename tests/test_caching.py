@@ -0,0 +1,21 @@
+"""
+tests of the app_caching result cache
+"""
+
+import app_caching as app_ca
+
+
+def test_memoize_sorts_only_unordered_arguments():
+    calls = []
+
+    @app_ca.memoize(unordered=("list_",))
+    def select(list_, columns=None):
+        calls.append((list_, columns))
+        return list(columns or list_)
+
+    assert select(["a", "b"], columns=["x", "y"]) == ["x", "y"]
+    # The selection order doesn't matter, the column order does:
+    assert select(["b", "a"], columns=["x", "y"]) == ["x", "y"]
+    assert select(["a", "b"], columns=["y", "x"]) == ["y", "x"]
+    assert len(calls) == 2
+    assert select.cache_info()["hits"] == 1
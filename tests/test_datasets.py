@@ -0,0 +1,88 @@
+"""
+tests of the chart dataset store and the route serving it
+"""
+
+import json
+import os
+import re
+
+import altair as alt
+import pytest
+
+import app_datasets as app_ds
+import app_graphing as app_gr
+
+
+@pytest.fixture
+def dataset_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_ds, "DATASET_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_serve_dataset(dataset_dir):
+    import app
+
+    client = app.server.test_client()
+    url = app_ds.store_dataset(b'[{"a":1}]')
+    name = re.fullmatch(r"/datasets/([0-9a-f]{32})\.json", url).group(1)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == b'[{"a":1}]'
+    assert response.headers["ETag"] == '"{}"'.format(name)
+    assert "immutable" in response.headers["Cache-Control"]
+
+    response = client.get(url, headers={"If-None-Match": '"{}"'.format(name)})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    assert client.get("/datasets/{}.json".format("0" * 32)).status_code == 404
+    for name in ["..%2F..%2Fetc%2Fpasswd", "../../src/app/app", "%2Fetc%2Fpasswd"]:
+        response = client.get("/datasets/{}.json".format(name), follow_redirects=True)
+        assert response.status_code == 404
+
+
+def test_cached_chart_restores_pruned_dataset(dataset_dir, boardgame):
+    data, index = boardgame
+    html = app_gr.top_n_plot(data, index, cat=["Dice"])
+    (url,) = re.findall(r"/datasets/[0-9a-f]{32}\.json", html)
+    path = dataset_dir / os.path.basename(url)
+
+    app_ds.prune_datasets(max_bytes=0)
+    assert not path.exists()
+
+    # The chart comes from the cache and stores its dataset again:
+    assert app_gr.top_n_plot(data, index, cat=["Dice"]) == html
+    assert path.exists()
+
+
+def without_values(spec):
+    """
+    :return: a vega-lite spec with empty inline data
+    """
+    if isinstance(spec, dict):
+        return {k: [] if k == "values" else without_values(v) for k, v in spec.items()}
+    if isinstance(spec, list):
+        return [without_values(v) for v in spec]
+    return spec
+
+
+def test_charts_inline_data_without_shared_store(dataset_dir, boardgame, monkeypatch):
+    data, index = boardgame
+    monkeypatch.setattr(app_ds, "SHARED_STORE", False)
+    charts = [
+        app_gr.scatter_plot_dates(data, index),
+        app_gr.scatter_plot_dates(data, index, "category", ["Dice", "Card Game"]),
+        app_gr.count_plot_dates(data, index, "mechanic", ["Dice Rolling"]),
+        app_gr.rank_plot_density(data, index),
+        app_gr.top_n_plot(data, index, cat=["Dice"]),
+    ]
+
+    for html in charts:
+        spec = json.loads(re.search(r"var spec = (\{.*?\});\n", html, re.S).group(1))
+        assert "__data_" not in html
+        assert "/datasets/" not in html
+        assert '"values": [{' in html
+        # Validating every record is slow, the spec is checked without them:
+        alt.Chart.from_dict(without_values(spec))
+    assert not list(dataset_dir.iterdir())
@@ -0,0 +1,94 @@
+"""
+tests of the similar games table of tsne_analysis and its loading by the app
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+import app_wrangling as app_wr
+import tsne_analysis
+
+
+def reference_neighbours(onehot, k, metric, priority):
+    """
+    :return: `top_k_neighbours()` by comparing every pair of games, with
+        the similarities rounded to float32 in the same steps
+    """
+    features = [set(np.flatnonzero(row)) for row in onehot]
+    neighbours = np.full((len(features), k), -1)
+    scores = np.zeros((len(features), k), dtype=np.float32)
+    for i, first in enumerate(features):
+        similar = []
+        for j, second in enumerate(features):
+            shared = np.float32(len(first & second))
+            if i == j or not shared:
+                continue
+            if metric == "cosine":
+                union = np.sqrt(np.float32(len(first)) * np.float32(len(second)))
+            else:
+                union = np.float32(len(first)) + np.float32(len(second)) - shared
+            similar.append((-(shared / union), priority[j], j))
+        for n, (score, _, j) in enumerate(sorted(similar)[:k]):
+            neighbours[i, n], scores[i, n] = j, -score
+    return neighbours, scores
+
+
+@pytest.mark.parametrize("metric", ["cosine", "jaccard"])
+@pytest.mark.parametrize("k, block_size", [(3, 256), (10, 4), (40, 7)])
+def test_top_k_neighbours_match_reference(metric, k, block_size):
+    rng = np.random.default_rng(0)
+    onehot = (rng.random((50, 12)) < 0.15).astype(np.float32)
+    # Duplicate games tie exactly, games without features have no neighbours:
+    onehot[10:15] = onehot[3]
+    onehot[20:22] = 0
+    priority = rng.integers(0, 3, size=len(onehot))
+
+    neighbours, scores = tsne_analysis.top_k_neighbours(
+        sparse.csr_matrix(onehot), k, metric, priority, block_size
+    )
+    expected_neighbours, expected_scores = reference_neighbours(
+        onehot, k, metric, priority
+    )
+
+    np.testing.assert_array_equal(neighbours, expected_neighbours)
+    np.testing.assert_array_equal(scores, expected_scores)
+    assert (neighbours[20:22] == -1).all()
+
+
+def test_top_k_neighbours_ties_by_priority():
+    onehot = sparse.csr_matrix(np.array([[1, 1], [1, 1], [1, 1], [1, 1], [0, 0]]))
+
+    neighbours, scores = tsne_analysis.top_k_neighbours(
+        onehot, k=3, priority=np.array([0, 3, 1, 2, 0])
+    )
+
+    assert neighbours[0].tolist() == [2, 3, 1]
+    assert neighbours[1].tolist() == [0, 2, 3]
+    assert neighbours[4].tolist() == [-1, -1, -1]
+    np.testing.assert_allclose(scores[0], 1)
+    with pytest.raises(ValueError):
+        tsne_analysis.top_k_neighbours(onehot, metric="euclidean")
+
+
+def test_load_similar_table(tmp_path):
+    path = str(tmp_path / "similar.npz")
+    onehot = sparse.csr_matrix(np.eye(4, dtype=np.float32))
+    table_ids = np.array([10, 20, 30, 40])
+    neighbours = np.array([[1, 2], [0, -1], [3, 0], [-1, -1]])
+    scores = np.array([[0.9, 0.5], [0.9, 0], [0.7, 0.5], [0, 0]], dtype=np.float32)
+    tsne_analysis.save_neighbours(
+        path, table_ids, onehot, np.array(list("abcd")), neighbours, scores
+    )
+
+    # Another row order, a game missing from the table and a game of
+    # the table missing from the data:
+    data = pd.DataFrame({"game_id": [30, 50, 10, 20]})
+    similar = app_wr.load_similar_table(path, data)
+
+    assert similar["rows"].tolist() == [[-1, 2], [-1, -1], [3, 0], [2, -1]]
+    np.testing.assert_allclose(
+        similar["scores"], [[0.7, 0.5], [0, 0], [0.9, 0.5], [0.9, 0]]
+    )
+    assert app_wr.load_similar_table(str(tmp_path / "missing.npz"), data) is None
@@ -0,0 +1,423 @@
+"""
+tests of app_wrangling against plain pandas versions of its functions
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import app_graphing as app_gr
+import app_wrangling as app_wr
+
+
+def test_snapshot_round_trip(tmp_path, boardgame):
+    data, index = boardgame
+    snapshot_path = str(tmp_path / "bgg.npz")
+
+    first, _ = app_wr.call_boardgame_data(snapshot_path=snapshot_path)
+    second, _ = app_wr.call_boardgame_data(snapshot_path=snapshot_path)
+
+    assert (tmp_path / "bgg.npz").exists()
+    assert not list(tmp_path.glob("*.tmp"))
+    assert second.equals(first)
+
+
+def test_empty_snapshot_falls_back_to_csv(tmp_path):
+    snapshot_path = tmp_path / "bgg.npz"
+    snapshot_path.write_bytes(b"")
+
+    assert app_wr.load_snapshot(str(snapshot_path), "hash") is None
+    data, _ = app_wr.call_boardgame_data(snapshot_path=str(snapshot_path))
+    assert len(data) > 0
+
+
+def test_truncated_snapshot_falls_back_to_csv(tmp_path, boardgame):
+    snapshot_path = tmp_path / "bgg.npz"
+    app_wr.call_boardgame_data(snapshot_path=str(snapshot_path))
+    payload = snapshot_path.read_bytes()
+    snapshot_path.write_bytes(payload[: len(payload) // 2])
+
+    source_hash = app_wr.file_hash(app_wr.CSV_PATH)
+    assert app_wr.load_snapshot(str(snapshot_path), source_hash) is None
+    data, _ = app_wr.call_boardgame_data(snapshot_path=str(snapshot_path))
+    assert len(data) == len(boardgame[0])
+
+
+def reference_filter(data, cat=[None], mech=[None], pub=[None], n=None, n_ratings=0):
+    """
+    :return: `call_boardgame_filter()` in plain pandas, a column matching
+        none of the rated games is ignored on its own
+    """
+    data = data[data["users_rated"] >= n_ratings]
+    keep = np.ones(len(data), dtype=bool)
+    for col, list_ in [("category", cat), ("mechanic", mech), ("publisher", pub)]:
+        col_keep = data[col].apply(lambda x: all(item in x for item in list_))
+        if col_keep.any():
+            keep &= col_keep.to_numpy()
+    data = data[keep].sort_values("average_rating", ascending=False)
+    return data[:n] if n else data
+
+
+def random_selections(data, count, seed=0):
+    """
+    :return: list of dict of random filter selections, mostly of
+        common values so that the columns overlap
+    """
+    rng = np.random.default_rng(seed)
+    values = {
+        col: data[col].explode().value_counts().index[:40].tolist()
+        for col in ["category", "mechanic", "publisher"]
+    }
+    selections = []
+    for _ in range(count):
+        selection = {}
+        for col, key in [
+            ("category", "cat"),
+            ("mechanic", "mech"),
+            ("publisher", "pub"),
+        ]:
+            size = rng.integers(0, 3)
+            selection[key] = list(rng.choice(values[col], size=size, replace=False))
+        selection["n_ratings"] = int(rng.choice([0, 100, 1000, 5000]))
+        selections.append(selection)
+    return selections
+
+
+def assert_same_games(result, expected):
+    assert sorted(result["game_id"]) == sorted(expected["game_id"])
+    assert list(result["average_rating"]) == list(expected["average_rating"])
+
+
+def test_filter_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    for selection in random_selections(reference_data, 120):
+        for n in [None, 10]:
+            expected = reference_filter(reference_data, n=n, **selection)
+            result = app_wr.call_boardgame_filter(data, index, n=n, **selection)
+            if n is None:
+                assert_same_games(result, expected)
+            else:
+                # Games tied on rating at the cut off may differ:
+                assert list(result["average_rating"]) == list(
+                    expected["average_rating"]
+                )
+
+
+def test_filter_disjoint_selections_match_nothing(boardgame, reference_data):
+    data, index = boardgame
+    # A category and a publisher each matching games, but no game with both:
+    category = "Wargame"
+    wargames = reference_data["category"].map(lambda x: category in x)
+    publishers = reference_data["publisher"].explode()
+    with_wargames = set(publishers[wargames[publishers.index]].dropna())
+    publisher = next(
+        p for p in publishers.value_counts().index if p not in with_wargames
+    )
+
+    expected = reference_filter(reference_data, cat=[category], pub=[publisher])
+    result = app_wr.call_boardgame_filter(data, index, cat=[category], pub=[publisher])
+
+    assert len(expected) == 0
+    assert len(result) == 0
+
+
+def reference_groups(data, col, list_, n_ratings=0):
+    """
+    :return: games matching any of `list_` in `col` with a group column of
+        the values each has, 'All Selected' if a game has all of them
+    """
+    data = data[data["users_rated"] >= n_ratings]
+    group = data[col].apply(
+        lambda x: [item for item in dict.fromkeys(list_) if item in x]
+    )
+    if len(list_) > 1:
+        group = group.apply(
+            lambda x: ["All Selected"] if len(x) == len(set(list_)) else x
+        )
+    return data.assign(group=group)[group.map(len) > 0]
+
+
+def test_radio_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    selections = [
+        ("category", ["Card Game"], 1900, 2200, 0),
+        ("category", ["Card Game", "Dice"], 1990, 2000, 100),
+        (
+            "mechanic",
+            ["Dice Rolling", "Hand Management", "Set Collection"],
+            1980,
+            2020,
+            150,
+        ),
+        ("publisher", ["Hasbro", "Parker Brothers", "Not A Publisher"], 1900, 2200, 0),
+    ]
+    for col, list_, year_in, year_out, n_ratings in selections:
+        years = reference_data["year_published"].dt.year
+        expected = reference_data[(years >= year_in) & (years <= year_out)]
+        expected = reference_groups(expected, col, list_, n_ratings).explode("group")
+        result = app_wr.call_boardgame_radio(
+            data, index, col, list_, year_in, year_out, n_ratings
+        )
+        assert sorted(zip(result["game_id"], result["group"])) == sorted(
+            zip(expected["game_id"], expected["group"])
+        )
+
+
+def reference_counts(data, col, list_, n_ratings=0):
+    """
+    :return: `call_boardgame_counts()` in plain pandas
+    """
+    if not list_:
+        data = data[data["users_rated"] >= n_ratings]
+        grouped = data.groupby("year_published").size()
+    else:
+        data = reference_groups(data, col, list_, n_ratings).explode("group")
+        grouped = data.groupby(["year_published", "group"]).size()
+    return grouped.to_frame("count").reset_index()
+
+
+def reference_top(data, col, year_in, year_out, n_ratings):
+    """
+    :return: `call_boardgame_top()` in plain pandas
+    """
+    years = data["year_published"].dt.year
+    data = data[(years >= year_in) & (years <= year_out)]
+    data = data[data["users_rated"] >= n_ratings].explode(col)
+    means = data.groupby(col)["average_rating"].mean()
+    return means.sort_values(ascending=False)[:5].to_frame().reset_index()
+
+
+def test_counts_match_reference(boardgame, reference_data):
+    data, index = boardgame
+    selections = [
+        ("category", []),
+        ("category", ["Card Game", "Dice"]),
+        ("mechanic", ["Dice Rolling", "Hand Management", "Set Collection"]),
+        ("publisher", ["Hasbro", "Parker Brothers"]),
+        ("category", ["Card Game", "Not A Category"]),
+    ]
+    # Slider steps use the count cube, other thresholds group the data:
+    for col, list_ in selections:
+        for n_ratings in [0, 100, 150, 5000, 20000]:
+            expected = reference_counts(reference_data, col, list_, n_ratings)
+            result = app_wr.call_boardgame_counts(data, index, col, list_, n_ratings)
+            expected = expected.sort_values(list(expected.columns[:-1]))
+            for column in expected.columns:
+                assert result[column].tolist() == expected[column].tolist()
+
+
+def test_top_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    for col in ["category", "mechanic", "publisher"]:
+        for year_in, year_out in [(1900, 2200), (1990, 2005), (2016, 2016)]:
+            for n_ratings in [0, 100, 150, 5000]:
+                args = (col, year_in, year_out, n_ratings)
+                expected = reference_top(reference_data, *args)
+                result = app_wr.call_boardgame_top(data, index, *args)
+                # Values tied on mean rating at the cut off may differ:
+                np.testing.assert_allclose(
+                    result["average_rating"], expected["average_rating"]
+                )
+
+
+def reference_density(data, col, list_, year_in, year_out, n_ratings):
+    """
+    :return: dict of group to densities over the rating bins and mean
+        rating, `call_boardgame_density()` in plain pandas
+    """
+    if not list_:
+        list_ = reference_top(data, col, year_in, year_out, n_ratings)[col].tolist()
+        year_in, year_out, n_ratings = 0, 10000, 0
+    years = data["year_published"].dt.year
+    data = data[(years >= year_in) & (years <= year_out)]
+    data = reference_groups(data, col, list_, n_ratings).explode("group")
+    densities = {}
+    for group, group_data in data.groupby("group"):
+        bins = pd.cut(group_data["average_rating"], np.arange(-0.25, 10.5, 0.5))
+        counts = bins.value_counts(sort=False).to_numpy()
+        densities[group] = (counts / counts.sum(), group_data["average_rating"].mean())
+    return densities
+
+
+def test_density_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    selections = [
+        ("category", [], 1990, 2010, 0),
+        ("mechanic", [], 1950, 2021, 500),
+        ("category", ["Strategy", "Economic", "Fantasy"], 1900, 2200, 1000),
+        ("mechanic", ["Dice Rolling", "Hand Management"], 1980, 2000, 150),
+        ("publisher", ["KOSMOS", "Hasbro", "Not A Publisher"], 1950, 2020, 0),
+    ]
+    for selection in selections:
+        expected = reference_density(reference_data, *selection)
+        result = app_wr.call_boardgame_density(data, index, *selection)
+        assert sorted(result["group"].unique()) == sorted(expected)
+        for group, group_data in result.groupby("group"):
+            density, mean = expected[group]
+            # Binned data leaves out the empty bins:
+            bins = (group_data["average_rating_bin"].astype(float) * 2).astype(int)
+            result_density = np.zeros(len(density))
+            result_density[bins] = group_data["density"]
+            np.testing.assert_allclose(result_density, density)
+            np.testing.assert_allclose(group_data["mean"].dropna(), [mean])
+
+
+def test_name_prefix_rows_order():
+    names = app_wr.build_name_index(
+        pd.Series(
+            [
+                "Catan",
+                "Catan: Cities & Knights",
+                "The Settlers of Catan",
+                "Concordia",
+                "Cat Lady",
+                "Scattergories",
+            ]
+        )
+    )
+    keep = np.ones(6, dtype=bool)
+    position = np.array([3, 1, 0, 5, 2, 4])
+
+    def found(query):
+        return app_wr.name_prefix_rows(names, query, keep, position).tolist()
+
+    # Names starting with the search first, then by position:
+    assert found("cat") == [1, 4, 0, 2]
+    assert found("cat kni") == [1]
+    assert found("settlers") == [2]
+    assert found("dice") == []
+    keep[4] = False
+    assert found("cat") == [1, 0, 2]
+
+
+def reference_search(data, search, n=30, **selection):
+    """
+    :return: `call_game_search()` in plain pandas
+    """
+    data = reference_filter(data, **selection).sort_index()
+    data = data.sort_values("average_rating", ascending=False, kind="stable")
+    query = re.findall(r"\w+", search.casefold())
+    if not query:
+        return data[:n]
+    words = data["name"].map(lambda x: re.findall(r"\w+", str(x).casefold()))
+    matched = words.map(lambda x: all(any(w.startswith(q) for w in x) for q in query))
+    data, words = data[matched], words[matched]
+    later = ~words.map(lambda x: " ".join(x).startswith(" ".join(query)))
+    return data.iloc[np.argsort(later.to_numpy(), kind="stable")][:n]
+
+
+def test_game_search_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    selections = [
+        {},
+        {"cat": ["Fantasy"]},
+        {"mech": ["Dice Rolling"]},
+        {"cat": ["Card Game"], "pub": ["Hasbro"]},
+    ]
+    for search in ["", "catan", "the", "War", "pandemic leg", "ticket to", "zzzz"]:
+        for selection in selections:
+            expected = reference_search(reference_data, search, **selection)
+            result = app_wr.call_game_search(data, index, search, **selection)
+            assert result["game_id"].tolist() == expected["game_id"].tolist()
+
+
+def test_year_stats_match_reference(boardgame, reference_data):
+    _, index = boardgame
+    expected = reference_data.groupby("year_published")["average_rating"].mean()
+
+    year_stats = index["year_stats"]
+    assert year_stats["year_published"].tolist() == expected.index.tolist()
+    np.testing.assert_allclose(year_stats["mean"], expected)
+
+
+def reference_similar(data, game_id, col=None, list_=None):
+    """
+    :return: every game allowed by `call_similar_games()`, from the closest
+    """
+    xyz = data[["x", "y", "z"]].to_numpy(dtype=np.float64)
+    row = np.flatnonzero(data["game_id"] == game_id)[0]
+    distance = np.sqrt(((xyz - xyz[row]) ** 2).sum(axis=1))
+    data = data.assign(distance=distance).drop(index=data.index[row])
+    if col:
+        data = data[data[col].map(lambda x: any(item in x for item in list_))]
+    return data.sort_values("distance", kind="stable")
+
+
+def test_similar_games_match_reference(boardgame, reference_data):
+    data, index = boardgame
+    rng = np.random.default_rng(0)
+    values = {
+        col: reference_data[col].explode().value_counts().index.tolist()
+        for col in ["category", "mechanic", "publisher"]
+    }
+    allowed = []
+    for _ in range(200):
+        game_id = int(rng.choice(reference_data["game_id"]))
+        k = int(rng.choice([1, 5, 10, 50]))
+        col, list_ = None, None
+        if rng.random() < 0.8:
+            col = str(rng.choice(list(values)))
+            # Common values so the filters are tested on both sides of
+            # SIMILAR_SCAN_ROWS, and rare ones matching fewer than k games:
+            top = values[col][: int(rng.choice([5, 100, len(values[col])]))]
+            list_ = list(rng.choice(top, size=int(rng.integers(1, 4))))
+
+        expected = reference_similar(reference_data, game_id, col, list_)
+        allowed.append(len(expected))
+        result = app_wr.call_similar_games(data, index, game_id, k, col, list_)
+        # Games at the same distance may come in another order:
+        np.testing.assert_allclose(result["distance"], expected["distance"][:k])
+        distances = expected.set_index("game_id")["distance"]
+        np.testing.assert_allclose(distances[result["game_id"]], result["distance"])
+
+    assert min(allowed) < 50
+    assert max(allowed) > app_wr.SIMILAR_SCAN_ROWS
+    assert len(data) - 1 in allowed
+
+
+def test_similar_games_unknown_or_unmatched(boardgame):
+    data, index = boardgame
+    game_id = int(data["game_id"].iloc[0])
+
+    assert len(app_wr.call_similar_games(data, index, -1)) == 0
+    result = app_wr.call_similar_games(
+        data, index, game_id, 5, "category", ["Not A Category"]
+    )
+    assert len(result) == 0
+    assert len(app_wr.call_similar_games(data, index, game_id, 5)) == 5
+
+
+def test_bin_year_rating_matches_reference(boardgame, reference_data):
+    data, index = boardgame
+    columns = ["game_id", "year_published", "average_rating", "users_rated"]
+    # All games as in the default scatter plot, and games by group:
+    frames = [
+        (data[columns], reference_data[columns], []),
+        (
+            app_wr.call_boardgame_radio(
+                data, index, "category", ["Card Game", "Dice"], columns=columns
+            ),
+            reference_groups(reference_data, "category", ["Card Game", "Dice"]).explode(
+                "group"
+            )[columns + ["group"]],
+            ["group"],
+        ),
+    ]
+    for frame, expected, groups in frames:
+        bins, sample = app_wr.bin_year_rating(frame)
+
+        expected = expected.reset_index(drop=True)
+        cell = (expected["average_rating"] // 0.25).rename("cell")
+        keys = [expected["year_published"], cell] + [expected[g] for g in groups]
+        counts = expected.groupby(keys).size()
+        assert bins["count"].tolist() == counts.tolist()
+        assert bins["count"].sum() == len(expected)
+        np.testing.assert_allclose(
+            bins["average_rating"], (counts.index.get_level_values("cell") + 0.5) / 4
+        )
+        # The sample is the first of the most rated games of each cell:
+        most_rated = expected.loc[expected.groupby(keys)["users_rated"].idxmax()]
+        assert sample["game_id"].tolist() == most_rated["game_id"].tolist()
+
+    assert len(data) > app_gr.SCATTER_MAX_POINTS